@@ -0,0 +1,26 @@
+#!/usr/bin/python3
+"""Benchmarks for the hbnb storage engines
+
+Run a benchmark from the repository root, e.g.:
+    python3 -m benchmarks.reload_memory 100000
+"""
+from datetime import datetime
+from uuid import uuid4
+
+
+def review_records(count):
+    """Returns count Review records in the format of file.json"""
+    now = datetime.now().isoformat()
+    place_ids = [str(uuid4()) for _ in range(max(1, count // 50))]
+    user_ids = [str(uuid4()) for _ in range(max(1, count // 20))]
+    records = {}
+    for i in range(count):
+        record_id = str(uuid4())
+        records['Review.' + record_id] = {
+            '__class__': 'Review', 'id': record_id,
+            'created_at': now, 'updated_at': now,
+            'text': 'Review number {} of a very nice place'.format(i),
+            'place_id': place_ids[i % len(place_ids)],
+            'user_id': user_ids[i % len(user_ids)]
+        }
+    return records
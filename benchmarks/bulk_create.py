@@ -0,0 +1,74 @@
+#!/usr/bin/python3
+"""Compares new() + save() per object with bulk_create() throughput
+
+Usage: python3 -m benchmarks.bulk_create [count]
+Per-object saves are timed on count // 100 rows (they slow down as the
+storage grows, so this flatters them), bulk_create() on count rows.
+DBStorage runs against HBNB_BENCH_URL (a temporary SQLite file by
+default).
+"""
+import os
+import sys
+import tempfile
+import time
+from os import getenv
+from sqlalchemy import create_engine
+from benchmarks import review_records
+from models.base_model import Base
+from models.engine.db_storage import DBStorage
+from models.engine.file_storage import FileStorage
+from models.review import Review
+
+
+def rate(count, run):
+    """Returns the rows per second of run()"""
+    start = time.perf_counter()
+    run()
+    return count / (time.perf_counter() - start)
+
+
+def one_by_one(storage, rows):
+    """Stores rows as Reviews with a save per object"""
+    for row in rows:
+        storage.new(Review(**row))
+        storage.save()
+
+
+def file_storage(folder):
+    """Returns an empty FileStorage writing into folder"""
+    FileStorage._FileStorage__file_path = os.path.join(folder, 'file.json')
+    FileStorage._FileStorage__objects.clear()
+    FileStorage._FileStorage__classes.clear()
+    return FileStorage()
+
+
+def db_storage(url):
+    """Returns a DBStorage on freshly created tables at url"""
+    engine = create_engine(url)
+    Base.metadata.drop_all(engine)
+    storage = DBStorage.__new__(DBStorage)
+    storage._DBStorage__engine = engine
+    storage.reload()
+    return storage
+
+
+def main(count):
+    """Prints the rows per second of both paths for both engines"""
+    folder = tempfile.mkdtemp()
+    url = getenv('HBNB_BENCH_URL',
+                 'sqlite:///' + os.path.join(folder, 'bench.db'))
+    rows = list(review_records(count).values())
+    few = rows[:max(1, count // 100)]
+    for name, make in (('file', lambda: file_storage(folder)),
+                       ('db', lambda: db_storage(url))):
+        single = rate(len(few), lambda: one_by_one(make(), few))
+        storage = make()
+        bulk = rate(count, lambda: storage.bulk_create(Review, rows))
+        print('{:<4} new+save {:9.0f} rows/s  bulk_create {:9.0f} rows/s'
+              '  ({:.0f}x)'.format(name, single, bulk, bulk / single))
+    for name in os.listdir(folder):
+        os.remove(os.path.join(folder, name))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
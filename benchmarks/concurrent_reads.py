@@ -0,0 +1,84 @@
+#!/usr/bin/python3
+"""Measures FileStorage read throughput as reader threads are added
+
+Usage: python3 -m benchmarks.concurrent_reads [count] [seconds]
+Each reader loops over get() and an indexed filter() on count places
+while one writer thread keeps creating, saving and deleting states.
+Reads and writes run under the storage reader-writer lock, so any error
+raised in a thread is reported.
+"""
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from models.engine.file_storage import FileStorage
+from models.place import Place
+from models.state import State
+
+
+def reader(storage, ids, stop, counts, errors):
+    """Reads until stop is set and appends its operation count"""
+    done = 0
+    try:
+        while not stop.is_set():
+            storage.get(Place, random.choice(ids))
+            low = random.randrange(1000)
+            storage.filter(Place, price_by_night__gte=low,
+                           price_by_night__lt=low + 5)
+            done += 2
+    except Exception as e:
+        errors.append(e)
+    counts.append(done)
+
+
+def writer(storage, stop, counts, errors):
+    """Writes until stop is set and appends its save count"""
+    done = 0
+    try:
+        while not stop.is_set():
+            state = State(name='bench')
+            storage.new(state)
+            storage.save()
+            storage.delete(state)
+            done += 1
+    except Exception as e:
+        errors.append(e)
+    counts.append(done)
+
+
+def main(count, seconds):
+    """Prints reads/s and saves/s for 1, 2, 4 and 8 reader threads"""
+    folder = tempfile.mkdtemp()
+    FileStorage._FileStorage__file_path = os.path.join(folder, 'file.json')
+    storage = FileStorage()
+    storage.bulk_create(Place, ({'city_id': 'c', 'user_id': 'u',
+                                 'name': str(n), 'price_by_night': n % 1000}
+                                for n in range(count)))
+    ids = [obj.id for obj in storage.all(Place).values()]
+    print('{} places, {} s per run'.format(count, seconds))
+    for threads in (1, 2, 4, 8):
+        stop = threading.Event()
+        reads, writes, errors = [], [], []
+        workers = [threading.Thread(target=reader,
+                                    args=(storage, ids, stop, reads, errors))
+                   for _ in range(threads)]
+        workers.append(threading.Thread(target=writer,
+                                        args=(storage, stop, writes, errors)))
+        for worker in workers:
+            worker.start()
+        time.sleep(seconds)
+        stop.set()
+        for worker in workers:
+            worker.join()
+        print('{} readers  {:9.0f} reads/s  {:6.1f} saves/s  {} errors'
+              .format(threads, sum(reads) / seconds, sum(writes) / seconds,
+                      len(errors)))
+    for name in os.listdir(folder):
+        os.remove(os.path.join(folder, name))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000,
+         float(sys.argv[2]) if len(sys.argv) > 2 else 3)
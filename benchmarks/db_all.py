@@ -0,0 +1,72 @@
+#!/usr/bin/python3
+"""Times DBStorage.all() without a class, sequential vs concurrent
+
+Usage: python3 -m benchmarks.db_all [count]
+The database is HBNB_BENCH_URL (a temporary SQLite file by default);
+its tables are dropped and refilled for each row count.
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from os import getenv
+from sqlalchemy import create_engine, insert
+from benchmarks import review_records
+from models.base_model import Base
+from models.engine.db_storage import DBStorage
+from models.review import Review
+from models.state import State
+
+
+def fill(engine, count):
+    """Recreates the tables with count reviews and count // 10 states"""
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    now = datetime.now()
+    rows = []
+    for record in review_records(count).values():
+        del record['__class__']
+        record['created_at'] = record['updated_at'] = now
+        rows.append(record)
+    states = [{'id': str(n), 'name': 'State {}'.format(n),
+               'created_at': now, 'updated_at': now}
+              for n in range(count // 10)]
+    with engine.begin() as conn:
+        conn.execute(insert(Review.__table__), rows)
+        if states:
+            conn.execute(insert(State.__table__), states)
+
+
+def timed_all(engine, workers):
+    """Returns the wall time of all() on a fresh session"""
+    DBStorage._DBStorage__workers = workers
+    storage = DBStorage.__new__(DBStorage)
+    storage._DBStorage__engine = engine
+    storage.reload()
+    start = time.perf_counter()
+    objs = storage.all()
+    elapsed = time.perf_counter() - start
+    assert len(objs) > 0
+    return elapsed
+
+
+def main(count):
+    """Times all() for count // 100, count // 10 and count rows"""
+    folder = tempfile.mkdtemp()
+    url = getenv('HBNB_BENCH_URL',
+                 'sqlite:///' + os.path.join(folder, 'bench.db'))
+    engine = create_engine(url)
+    for rows in (count // 100, count // 10, count):
+        fill(engine, rows)
+        sequential = timed_all(engine, 1)
+        concurrent = timed_all(engine, 6)
+        print('{:>8} rows  sequential {:7.3f} s  concurrent {:7.3f} s'
+              .format(rows + rows // 10, sequential, concurrent))
+    engine.dispose()
+    for name in os.listdir(folder):
+        os.remove(os.path.join(folder, name))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,43 @@
+#!/usr/bin/python3
+"""Measures the bytes held per stored object by each FileStorage mode
+
+Usage: python3 -m benchmarks.record_memory [count]
+"""
+import gc
+import json
+import os
+import sys
+import tempfile
+import tracemalloc
+from benchmarks import review_records
+from models.engine.file_storage import FileStorage
+
+
+def main(count):
+    """Reloads count reviews in each mode and prints bytes per object"""
+    path = os.path.join(tempfile.mkdtemp(), 'file.json')
+    with open(path, 'w') as f:
+        json.dump(review_records(count), f)
+    FileStorage._FileStorage__file_path = path
+    storage = FileStorage()
+    print('{} records'.format(count))
+    for label, lazy, compact in (('model instances', False, False),
+                                 ('lazy dict records', True, False),
+                                 ('lazy compact records', True, True)):
+        FileStorage._FileStorage__lazy = lazy
+        FileStorage._FileStorage__compact = compact
+        FileStorage._FileStorage__objects.clear()
+        FileStorage._FileStorage__classes.clear()
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        storage.reload()
+        gc.collect()
+        held = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        print('{:<22} {:8.0f} bytes/object'.format(label, held / count))
+    os.remove(path)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,61 @@
+#!/usr/bin/python3
+"""Compares the peak memory of FileStorage.reload() with json.load()
+
+Usage: python3 -m benchmarks.reload_memory [count]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from benchmarks import review_records
+from models.engine.file_storage import FileStorage, _RecordStream
+
+
+def measure(label, load):
+    """Prints the duration of load() and its peak traced memory
+
+    The two are taken from separate runs since tracing slows Python down.
+    """
+    start = time.perf_counter()
+    load()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    load()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print('{:<24} {:8.2f} s {:10.1f} MiB peak'.format(
+        label, elapsed, peak / (1 << 20)))
+    return peak
+
+
+def main(count):
+    """Writes count reviews to a temporary file.json and loads it"""
+    path = os.path.join(tempfile.mkdtemp(), 'file.json')
+    with open(path, 'w') as f:
+        json.dump(review_records(count), f)
+    print('{} records, {:.1f} MiB on disk'.format(
+        count, os.path.getsize(path) / (1 << 20)))
+
+    def parse_whole():
+        """Decodes the whole document at once"""
+        with open(path) as f:
+            json.load(f)
+
+    def parse_stream():
+        """Decodes the document record by record"""
+        with open(path) as f:
+            for _ in _RecordStream(f):
+                pass
+
+    measure('json.load (decode only)', parse_whole)
+    measure('stream (decode only)', parse_stream)
+    FileStorage._FileStorage__file_path = path
+    storage = FileStorage()
+    measure('FileStorage.reload', storage.reload)
+    os.remove(path)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,75 @@
+#!/usr/bin/python3
+"""Times the first all() of a sharded FileStorage, shards decoded in this
+process vs in a pool of worker processes
+
+Usage: python3 -m benchmarks.shard_reload [count [workers]]
+Two shards (count reviews and count amenities) are written to a
+temporary folder and read back with HBNB_FILE_WORKERS=1 and =workers
+(os.cpu_count() by default), each in eager and in lazy mode. Worker
+processes only decode JSON: the records are pickled back and every object
+is still built here, so a gain needs several free cores.
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from uuid import uuid4
+from benchmarks import review_records
+from models.engine.file_storage import FileStorage
+
+
+def amenity_records(count):
+    """Returns count Amenity records in the format of file.json"""
+    now = datetime.now().isoformat()
+    records = {}
+    for i in range(count):
+        record_id = str(uuid4())
+        records['Amenity.' + record_id] = {
+            '__class__': 'Amenity', 'id': record_id, 'created_at': now,
+            'updated_at': now, 'name': 'Amenity number {}'.format(i)}
+    return records
+
+
+def timed_load(path, workers, lazy):
+    """Returns the wall time of reload() and all() on fresh state"""
+    FileStorage._FileStorage__file_path = path
+    FileStorage._FileStorage__layout = 'sharded'
+    FileStorage._FileStorage__workers = workers
+    FileStorage._FileStorage__lazy = lazy
+    FileStorage._FileStorage__objects.clear()
+    storage = FileStorage()
+    start = time.perf_counter()
+    storage.reload()
+    objs = storage.all()
+    elapsed = time.perf_counter() - start
+    assert len(objs) > 0
+    return elapsed
+
+
+def main(count, workers):
+    """Prints the load times of both modes with 1 and workers workers"""
+    folder = tempfile.mkdtemp()
+    path = os.path.join(folder, 'file.json')
+    size = 0
+    for name, records in (('Review', review_records(count)),
+                          ('Amenity', amenity_records(count))):
+        shard = os.path.join(folder, 'file.{}.json'.format(name))
+        with open(shard, 'w') as f:
+            json.dump(records, f)
+        size += os.path.getsize(shard)
+    print('2 shards, {:.1f} MiB, {} CPUs'.format(
+        size / (1 << 20), os.cpu_count()))
+    for lazy in (False, True):
+        sequential = timed_load(path, 1, lazy)
+        parallel = timed_load(path, workers, lazy)
+        print('lazy={!s:<5}  1 worker {:7.3f} s  {} workers {:7.3f} s'
+              .format(lazy, sequential, workers, parallel))
+    for name in os.listdir(folder):
+        os.remove(os.path.join(folder, name))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count() or 1)
@@ -0,0 +1,53 @@
+#!/usr/bin/python3
+"""Compares FileStorage reload and single lookups across layouts
+
+Usage: python3 -m benchmarks.snapshot_formats [count]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+from benchmarks import review_records
+from models.engine import binary_format
+from models.engine.file_storage import FileStorage
+from models.review import Review
+
+
+def timed(run):
+    """Returns the wall time of run() in seconds"""
+    start = time.perf_counter()
+    run()
+    return time.perf_counter() - start
+
+
+def main(count):
+    """Writes count reviews in both formats and times reload + get"""
+    folder = tempfile.mkdtemp()
+    path = os.path.join(folder, 'file.json')
+    records = review_records(count)
+    with open(path, 'w') as f:
+        json.dump(records, f)
+    binary_format.from_json(path, os.path.join(folder, 'file.bin'))
+    some_id = next(iter(records.values()))['id']
+    del records
+
+    FileStorage._FileStorage__file_path = path
+    storage = FileStorage()
+    print('{} records'.format(count))
+    for layout in ('json', 'binary'):
+        for lazy in (False, True):
+            FileStorage._FileStorage__layout = layout
+            FileStorage._FileStorage__lazy = lazy
+            FileStorage._FileStorage__objects.clear()
+            FileStorage._FileStorage__classes.clear()
+            load = timed(storage.reload)
+            get = timed(lambda: storage.get(Review, some_id))
+            print('{:<7} lazy={:<5} reload {:7.3f} s  first get {:8.5f} s'
+                  .format(layout, str(lazy), load, get))
+    for name in os.listdir(folder):
+        os.remove(os.path.join(folder, name))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
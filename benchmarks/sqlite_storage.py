@@ -0,0 +1,111 @@
+#!/usr/bin/python3
+"""Compares SQLiteStorage with FileStorage as the object count grows
+
+Usage: python3 -m benchmarks.sqlite_storage [count ...]
+For each count (10000, 100000 and 1000000 by default) both engines are
+filled with count reviews through bulk_create(), then timed on:
+    reload  a fresh storage up to its first get()
+    get     1000 lookups by id
+    filter  100 filter(place_id=...) queries
+    save    200 new() + save() of one object each
+SQLite runs once committing every save and once committing every 100
+(HBNB_SQLITE_COMMIT_EVERY=100). The generated reviews point to no real
+place or user, so foreign keys are not enforced.
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from benchmarks import review_records
+from models.base_model import Base
+from models.engine.file_storage import FileStorage
+from models.engine.sqlite_storage import SQLiteStorage
+from models.review import Review
+
+
+def elapsed(run):
+    """Returns the wall time of run() in seconds"""
+    start = time.perf_counter()
+    run()
+    return time.perf_counter() - start
+
+
+def file_storage(folder):
+    """Returns a FileStorage reading folder/file.json from scratch"""
+    FileStorage._FileStorage__file_path = os.path.join(folder, 'file.json')
+    FileStorage._FileStorage__objects.clear()
+    FileStorage._FileStorage__classes.clear()
+    return FileStorage()
+
+
+def sqlite_storage(folder, commit_every=1):
+    """Returns a SQLiteStorage on folder/hbnb.db with a new session"""
+    os.environ['HBNB_SQLITE_COMMIT_EVERY'] = str(commit_every)
+    storage = SQLiteStorage(os.path.join(folder, 'hbnb.db'))
+    storage.reload()
+    return storage
+
+
+def fill(make, rows):
+    """Stores rows in an emptied storage and returns the load time"""
+    storage = make()
+    if isinstance(storage, SQLiteStorage):
+        Base.metadata.drop_all(storage._DBStorage__engine)
+        storage.reload()
+    return elapsed(lambda: (storage.bulk_create(Review, rows),
+                            storage.save()))
+
+
+def timings(make, ids, place_ids):
+    """Returns the reload, get, filter and save times of make()"""
+    storage = None
+
+    def reload():
+        """Opens the storage and reads one object"""
+        nonlocal storage
+        storage = make()
+        storage.reload()
+        storage.get(Review, ids[0])
+
+    def saves():
+        """Stores objects one at a time"""
+        for n in range(200):
+            storage.new(Review(place_id=place_ids[0], user_id='u',
+                               text=str(n)))
+            storage.save()
+        storage.close()
+
+    return (elapsed(reload),
+            elapsed(lambda: [storage.get(Review, random.choice(ids))
+                             for _ in range(1000)]),
+            elapsed(lambda: [storage.filter(Review,
+                                            place_id=random.choice(place_ids))
+                             for _ in range(100)]),
+            elapsed(saves))
+
+
+def main(counts):
+    """Prints the timings of both engines for every count"""
+    os.environ['HBNB_SQLITE_FOREIGN_KEYS'] = '0'
+    folder = tempfile.mkdtemp()
+    print('{:>8} {:<10} {:>8} {:>8} {:>8} {:>8} {:>8}'.format(
+        'objects', 'engine', 'load s', 'reload s', 'get s', 'filter s',
+        'save s'))
+    for count in counts:
+        rows = list(review_records(count).values())
+        ids = [row['id'] for row in rows]
+        place_ids = sorted({row['place_id'] for row in rows})
+        for name, make in (
+                ('file', lambda: file_storage(folder)),
+                ('sqlite', lambda: sqlite_storage(folder)),
+                ('sqlite/100', lambda: sqlite_storage(folder, 100))):
+            load = fill(make, rows)
+            print('{:>8} {:<10} {:8.2f} {:8.3f} {:8.3f} {:8.3f} {:8.3f}'
+                  .format(count, name, load, *timings(make, ids, place_ids)))
+    for name in os.listdir(folder):
+        os.remove(os.path.join(folder, name))
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [10000, 100000, 1000000])
@@ -1,9 +1,17 @@
 #!/usr/bin/python3
 """ Console Module """
 import cmd
+import csv
+import gzip
+import json
+import os
+import re
 import sys
+import time
+from datetime import datetime
+from sqlalchemy.exc import SQLAlchemyError
 from models.base_model import BaseModel
-from models.__init__ import storage
+from models.__init__ import storage, storage_type, db_types
 from models.user import User
 from models.place import Place
 from models.state import State
@@ -23,12 +31,18 @@ class HBNBCommand(cmd.Cmd):
                'State': State, 'City': City, 'Amenity': Amenity,
                'Review': Review
               }
-    dot_cmds = ['all', 'count', 'show', 'destroy', 'update']
+    dot_cmds = ['all', 'count', 'show', 'destroy', 'update', 'where',
+                'search']
     types = {
              'number_rooms': int, 'number_bathrooms': int,
              'max_guest': int, 'price_by_night': int,
              'latitude': float, 'longitude': float
             }
+    lookups = {
+               '=': '', '==': '', '!=': '__ne', '<': '__lt', '<=': '__lte',
+               '>': '__gt', '>=': '__gte'
+              }
+    import_batch = 1000
 
     def preloop(self):
         """Prints if isatty is false"""
@@ -149,6 +163,205 @@ class HBNBCommand(cmd.Cmd):
         storage.save()
         print(new_instance.id)
 
+    def do_import(self, args):
+        """
+        Bulk loads objects of a class from a CSV or JSON Lines file
+        Usage: import <class name> <file.csv|file.jsonl>
+        """
+        args = args.split()
+        if not args:
+            print("** class name missing **")
+            return
+        if args[0] not in HBNBCommand.classes:
+            print("** class doesn't exist **")
+            return
+        if len(args) < 2:
+            print("** file name missing **")
+            return
+        ext = os.path.splitext(args[1])[1].lower()
+        if ext not in ('.csv', '.jsonl'):
+            print("** unsupported file format **")
+            return
+        try:
+            f = open(args[1], 'r', newline='')
+        except OSError:
+            print("** file doesn't exist **")
+            return
+
+        model = HBNBCommand.classes[args[0]]
+        parents = {}  # foreign key attribute -> referenced class
+        for column in model.__table__.columns:
+            for fk in column.foreign_keys:
+                for parent in HBNBCommand.classes.values():
+                    if getattr(parent, '__tablename__', None) == \
+                            fk.column.table.name:
+                        parents[column.name] = parent
+        columns = set(model.__table__.columns.keys()) | {'__class__'}
+        required = sorted(column.name for column in model.__table__.columns
+                          if not column.nullable and column.default is None)
+        known = set()  # (attribute, value) pairs already checked
+        imported = skipped = 0
+        batch = []
+        start = time.perf_counter()
+        with f:
+            lines = csv.DictReader(f) if ext == '.csv' else \
+                (line for line in f if line.strip())
+            for number, line in enumerate(lines, 1):
+                error = None
+                try:
+                    row = line if ext == '.csv' else json.loads(line)
+                    row = {k: HBNBCommand.types[k](v)
+                           if k in HBNBCommand.types else v
+                           for k, v in row.items() if v not in ('', None)}
+                except (ValueError, TypeError, AttributeError):
+                    error = "invalid row"
+                if not error:
+                    error = self.__check_row(row, columns, required)
+                for attr, parent in parents.items():
+                    if error:
+                        break
+                    value = row.get(attr)
+                    if (attr, value) in known:
+                        continue
+                    if value is None or storage.get(parent, value) is None:
+                        error = "unknown {} {}".format(attr, value)
+                    else:
+                        known.add((attr, value))
+                if error:
+                    print("** row {}: {} **".format(number, error))
+                    skipped += 1
+                    continue
+
+                batch.append((number, row))
+                if len(batch) >= HBNBCommand.import_batch:
+                    stored = self.__store(model, batch)
+                    imported += stored
+                    skipped += len(batch) - stored
+                    batch = []
+                    print("{} rows ({:.0f} rows/s)".format(
+                        imported, imported / (time.perf_counter() - start)))
+        if batch:
+            stored = self.__store(model, batch)
+            imported += stored
+            skipped += len(batch) - stored
+        storage.save()
+        elapsed = time.perf_counter() - start
+        print("{} rows imported, {} skipped in {:.2f} s ({:.0f} rows/s)"
+              .format(imported, skipped, elapsed,
+                      imported / elapsed if elapsed else 0))
+
+    def __check_row(self, row, columns, required):
+        """Returns why an import row cannot be stored, or None"""
+        unknown = sorted(set(row) - columns)
+        if unknown:
+            return "unknown column {}".format(unknown[0])
+        if 'id' in row and not isinstance(row['id'], str):
+            return "invalid id {}".format(row['id'])
+        for name in ('created_at', 'updated_at'):
+            if name in row:
+                try:
+                    datetime.strptime(row[name], "%Y-%m-%dT%H:%M:%S.%f")
+                except (ValueError, TypeError):
+                    return "invalid {} {}".format(name, row[name])
+        for name in required:
+            if name not in row:
+                return "missing {}".format(name)
+        return None
+
+    def __store(self, model, batch):
+        """Stores a batch of (row number, row) pairs without saving;
+        returns the number stored, 0 if the storage rejected the batch"""
+        try:
+            return storage.bulk_create(model, [row for _, row in batch],
+                                       save=False)
+        except (SQLAlchemyError, ValueError, TypeError) as e:
+            print("** rows {}-{}: batch rolled back ({}) **".format(
+                batch[0][0], batch[-1][0], type(e).__name__))
+            return 0
+
+    def help_import(self):
+        """ Help information for the import command """
+        print("Bulk loads objects of a class from a CSV or JSONL file")
+        print("[Usage]: import <className> <file.csv|file.jsonl>\n")
+
+    def do_export(self, args):
+        """
+        Streams the objects of a class, or all objects, to a file
+        Usage: export <class name|all> <path> [--format jsonl|csv]
+            [--since <timestamp>]
+        The format defaults to the extension of path; a path ending in
+        .gz is gzip compressed.
+        """
+        args = args.split()
+        if not args:
+            print("** class name missing **")
+            return
+        if args[0] != 'all' and args[0] not in HBNBCommand.classes:
+            print("** class doesn't exist **")
+            return
+        if len(args) < 2:
+            print("** file name missing **")
+            return
+        path = args[1]
+        base = path[:-3] if path.endswith('.gz') else path
+        fmt = 'csv' if base.lower().endswith('.csv') else 'jsonl'
+        since = None
+        options = args[2:]
+        while options and options[0] in ('--format', '--since'):
+            if len(options) < 2:
+                print("** value missing **")
+                return
+            if options[0] == '--format':
+                fmt = options[1]
+                if fmt not in ('jsonl', 'csv'):
+                    print("** unsupported format: {} **".format(fmt))
+                    return
+            else:
+                try:
+                    since = datetime.fromisoformat(options[1])
+                except ValueError:
+                    print("** invalid timestamp: {} **".format(options[1]))
+                    return
+            options = options[2:]
+
+        if args[0] == 'all':
+            cls = None
+            selected = list(HBNBCommand.classes.values())
+        else:
+            cls = HBNBCommand.classes[args[0]]
+            selected = [cls]
+        opener = gzip.open if path.endswith('.gz') else open
+        exported = 0
+        try:
+            f = opener(path, 'wt', newline='')
+        except OSError:
+            print("** can't write file: {} **".format(path))
+            return
+        with f:
+            if fmt == 'csv':
+                fields = ['__class__']
+                for model in selected:
+                    table = getattr(model, '__table__', None)
+                    for name in (['id', 'created_at', 'updated_at']
+                                 if table is None else table.columns.keys()):
+                        if name not in fields:
+                            fields.append(name)
+                writer = csv.DictWriter(f, fields, extrasaction='ignore')
+                writer.writeheader()
+            for record in storage.records(cls, since=since):
+                if fmt == 'csv':
+                    writer.writerow(record)
+                else:
+                    f.write(json.dumps(record) + '\n')
+                exported += 1
+        print("{} rows exported to {}".format(exported, path))
+
+    def help_export(self):
+        """ Help information for the export command """
+        print("Streams objects to a JSON Lines or CSV file")
+        print("[Usage]: export <className|all> <path> [--format jsonl|csv]"
+              " [--since <timestamp>]\n")
+
     def help_create(self):
         """ Help information for the create method """
         print("Creates a class of any type")
@@ -180,11 +393,11 @@ class HBNBCommand(cmd.Cmd):
             print("** instance id missing **")
             return
 
-        key = c_name + "." + c_id
-        try:
-            print(storage.all()[key])
-        except KeyError:
+        obj = storage.get(HBNBCommand.classes[c_name], c_id)
+        if obj is None:
             print("** no instance found **")
+        else:
+            print(obj)
 
     def help_show(self):
         """ Help information for the show command """
@@ -215,13 +428,13 @@ class HBNBCommand(cmd.Cmd):
             print("** instance id missing **")
             return
 
-        key = c_name + "." + c_id
-
-        try:
-            del (storage.all()[key])
-            storage.save()
-        except KeyError:
+        obj = storage.get(HBNBCommand.classes[c_name], c_id)
+        if obj is None:
             print("** no instance found **")
+        else:
+            storage.delete(obj)
+            if storage_type in db_types:
+                storage.save()  # DBStorage.delete() only stages it
 
     def help_destroy(self):
         """ Help information for the destroy command """
@@ -231,29 +444,49 @@ class HBNBCommand(cmd.Cmd):
     def do_all(self, args):
         """
         Shows all objects, or all objects of a class
-        Usage: all (optional: <class name>)
+        Usage: all (optional: <class name>) [--limit <n>] [--after <id>]
             <class name>.all()
+        Without a class name --after takes a <class name>.<id> key.
         """
-        print_list = []
-
-        if args:
-            args = args.split(' ')[0]  # remove possible trailing args
-            if args not in HBNBCommand.classes:
+        args = args.split()
+        c_name = ''
+        if args and not args[0].startswith('--'):
+            c_name = args.pop(0)
+            if c_name not in HBNBCommand.classes:
                 print("** class doesn't exist **")
                 return
-            for k, v in storage.all(HBNBCommand.classes[args]).items():
-                if k.split('.')[0] == args:
-                    print_list.append(str(v))
-        else:
-            for k, v in storage.all().items():
-                print_list.append(str(v))
 
-        print(print_list)
+        limit = after = None
+        while args and args[0] in ('--limit', '--after'):
+            if len(args) < 2:
+                print("** value missing **")
+                return
+            if args[0] == '--limit':
+                if not args[1].isdigit():
+                    print("** invalid limit: {} **".format(args[1]))
+                    return
+                limit = int(args[1])
+            else:
+                after = c_name + '.' + args[1] if c_name else args[1]
+            args = args[2:]
+
+        cls = HBNBCommand.classes[c_name] if c_name else None
+        sep = '['
+        shown = 0
+        for obj in storage.iter(cls, after=after):
+            if limit is not None and shown >= limit:
+                break
+            if c_name and obj.__class__.__name__ != c_name:
+                continue
+            print(sep + repr(str(obj)), end='')
+            sep = ', '
+            shown += 1
+        print('[]' if sep == '[' else ']')
 
     def help_all(self):
         """ Help information for the all command """
         print("Shows all objects, or all of a class")
-        print("[Usage]: all <className>\n")
+        print("[Usage]: all <className> [--limit <n>] [--after <id>]\n")
 
     def do_count(self, args):
         """
@@ -261,18 +494,121 @@ class HBNBCommand(cmd.Cmd):
         Useage: <class name>.count()
         """
         if args:
-            count = 0
             args = args.split(' ')[0]  # remove possible trailing args
             if args not in HBNBCommand.classes:
                 print("** class doesn't exist **")
                 return
-            for k, v in storage.all().items():
-                if args == k.split('.')[0]:
-                    count += 1
-            print(count)
+            print(storage.count(HBNBCommand.classes[args]))
         else:
             print("** class name missing **")
 
+    def do_where(self, args):
+        """
+        Shows the objects of a class matching all given conditions
+        Usage: where <class name> <attribute><op><value> ...
+            <class name>.where(<attribute><op><value>, ...)
+        <op> is one of = != < <= > >=
+        """
+        args = args.split()
+        if not args:
+            print("** class name missing **")
+            return
+        if args[0] not in HBNBCommand.classes:
+            print("** class doesn't exist **")
+            return
+
+        criteria = {}
+        for arg in args[1:]:
+            match = re.match(r'^(\w+)(==|!=|<=|>=|=|<|>)(.+)$', arg)
+            if not match:
+                print("** invalid condition: {} **".format(arg))
+                return
+            att_name, op, att_val = match.groups()
+            att_val = att_val.strip('"').replace('_', ' ')
+            if att_name in HBNBCommand.types:
+                try:
+                    att_val = HBNBCommand.types[att_name](att_val)
+                except ValueError:
+                    print("** invalid value: {} **".format(att_val))
+                    return
+            criteria[att_name + HBNBCommand.lookups[op]] = att_val
+
+        try:
+            objs = storage.filter(HBNBCommand.classes[args[0]], **criteria)
+        except ValueError as e:
+            print("** {} **".format(e))
+            return
+        print([str(v) for v in objs.values()])
+
+    def help_where(self):
+        """ Help information for the where command """
+        print("Shows the objects of a class matching conditions")
+        print("[Usage]: where <className> <attName><op><attVal> ...\n")
+
+    def do_search(self, args):
+        """
+        Shows the objects of a class matching search terms, best first
+        Usage: search <class name> <terms>
+            <class name>.search(<terms>)
+        """
+        args = args.partition(' ')
+        if not args[0]:
+            print("** class name missing **")
+            return
+        if args[0] not in HBNBCommand.classes:
+            print("** class doesn't exist **")
+            return
+        terms = args[2].strip().strip('"')
+        if not terms:
+            print("** search terms missing **")
+            return
+
+        objs = storage.search(HBNBCommand.classes[args[0]], terms)
+        print([str(v) for v in objs])
+
+    def help_search(self):
+        """ Help information for the search command """
+        print("Shows the objects of a class matching terms, best first")
+        print("[Usage]: search <className> <terms>\n")
+
+    def do_pool(self, args):
+        """
+        Shows the connection pool metrics of the database storage
+        Usage: pool
+        """
+        if not hasattr(storage, 'pool_metrics'):
+            print("** storage has no connection pool **")
+            return
+        for name, value in storage.pool_metrics().items():
+            if isinstance(value, float):
+                print("{}: {:.3f}".format(name, value))
+            else:
+                print("{}: {}".format(name, value))
+
+    def help_pool(self):
+        """ Help information for the pool command """
+        print("Shows the connection pool metrics of the database storage")
+        print("[Usage]: pool\n")
+
+    def do_cache(self, args):
+        """
+        Shows the object cache counters of the database storage
+        Usage: cache
+        """
+        if not hasattr(storage, 'cache_stats'):
+            print("** storage has no object cache **")
+            return
+        for name, value in storage.cache_stats().items():
+            if isinstance(value, float):
+                print("{}: {:.3f}".format(name, value))
+            else:
+                print("{}: {}".format(name, value))
+
+    def help_cache(self):
+        """ Help information for the cache command """
+        print("Shows the object cache counters of the database storage")
+        print("[Usage]: cache\n")
+
     def help_count(self):
         """ """
         print("Usage: count <class_name>")
@@ -305,11 +641,9 @@ class HBNBCommand(cmd.Cmd):
             print("** instance id missing **")
             return
 
-        # generate key from class and id
-        key = c_name + "." + c_id
-
-        # determine if key is present
-        if key not in storage.all():
+        # retrieve the object from storage
+        new_dict = storage.get(HBNBCommand.classes[c_name], c_id)
+        if new_dict is None:
             print("** no instance found **")
             return
 
@@ -342,9 +676,6 @@ class HBNBCommand(cmd.Cmd):
 
             args = [att_name, att_val]
 
-        # retrieve dictionary of current objects
-        new_dict = storage.all()[key]
-
         # iterate through attr names and values
         for i, att_name in enumerate(args):
             # block only runs on even iterations
@@ -360,8 +691,8 @@ class HBNBCommand(cmd.Cmd):
                 if att_name in HBNBCommand.types:
                     att_val = HBNBCommand.types[att_name](att_val)
 
-                # update dictionary with name, value pair
-                new_dict.__dict__.update({att_name: att_val})
+                # update instance with name, value pair
+                setattr(new_dict, att_name, att_val)
 
         new_dict.save()  # save updates to file
 
@@ -1,16 +1,31 @@
 #!/usr/bin/python3
 """
-This module instantiates an object of class FileStorage or DBStorage depending
-on the environment variable HBNB_TYPE_STORAGE
+This module instantiates the storage engine named by the environment
+variable HBNB_TYPE_STORAGE: FileStorage (the default), DBStorage ("db"),
+SQLiteStorage ("sqlite", DBStorage on a local SQLite file) or one of the
+asyncio counterparts ("async_file", "async_db"). An asyncio storage is
+only constructed here; the application must await storage.reload()
+before using it.
 """
 from os import getenv
 
 storage_type = getenv('HBNB_TYPE_STORAGE')
+db_types = ('db', 'sqlite', 'async_db')
 
 if storage_type == 'db':
     from models.engine.db_storage import DBStorage
     storage = DBStorage()
     storage.reload()
+elif storage_type == 'sqlite':
+    from models.engine.sqlite_storage import SQLiteStorage
+    storage = SQLiteStorage()
+    storage.reload()
+elif storage_type == 'async_db':
+    from models.engine.async_storage import AsyncDBStorage
+    storage = AsyncDBStorage()
+elif storage_type == 'async_file':
+    from models.engine.async_storage import AsyncFileStorage
+    storage = AsyncFileStorage()
 else:
     from models.engine.file_storage import FileStorage
     storage = FileStorage()
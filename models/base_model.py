@@ -37,21 +37,30 @@ class BaseModel:
             self.created_at = datetime.now()
             self.updated_at = datetime.now()
 
+    def __setattr__(self, name, value):
+        """Sets an attribute and flags the instance as changed in storage"""
+        super().__setattr__(name, value)
+        if not name.startswith('_'):
+            models.storage.touch(self)
+
     def __str__(self):
         """Returns a string representation of the instance"""
         cls = (str(type(self)).split('.')[-1]).split('\'')[0]
         return '[{}] ({}) {}'.format(cls, self.id, self.__dict__)
 
     def save(self):
-        """Updates updated_at with current time when instance is changed"""
+        """Updates updated_at with current time when instance is changed;
+        returns what storage.save() returns (a coroutine to await on an
+        asyncio storage)"""
         self.updated_at = datetime.now()
         models.storage.new(self)
-        models.storage.save()
+        return models.storage.save()
 
     def delete(self):
-        """Deletes the current instance from storage"""
+        """Deletes the current instance from storage; returns what
+        storage.delete() returns"""
         from models import storage
-        storage.delete(self)
+        return storage.delete(self)
 
     def to_dict(self):
         """Convert instance into dict format"""
@@ -3,11 +3,21 @@
 from sqlalchemy import Column, String, ForeignKey
 from sqlalchemy.orm import relationship
 from models.base_model import BaseModel, Base
+import models
+from models.place import Place
 
 
 class City(BaseModel, Base):
     """ The city class, contains state ID and name """
     __tablename__ = 'cities'
     name = Column(String(128), nullable=False)
-    state_id = Column(String(60), ForeignKey('states.id'), nullable=False)
-    places = relationship("Place", backref="city", cascade="all, delete")
+    state_id = Column(String(60), ForeignKey('states.id'), nullable=False,
+                      index=True)
+
+    if models.storage_type in models.db_types:
+        places = relationship("Place", backref="city", cascade="all, delete")
+    else:
+        @property
+        def places(self):
+            """ Getter for places """
+            return models.storage.related(Place, 'city_id', self.id)
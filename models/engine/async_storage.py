@@ -0,0 +1,284 @@
+#!/usr/bin/python3
+"""Defines the asyncio storage engines
+
+AsyncFileStorage runs FileStorage in worker threads, which its
+reader-writer lock makes safe, so file I/O never blocks the event loop.
+AsyncDBStorage runs on the SQLAlchemy asyncio engine (aiomysql driver)
+with a session per task. Both are used the same way:
+
+    await storage.reload()
+    storage.new(obj)
+    await storage.save()
+    objs = await storage.all(State)
+
+new() and touch() stay plain methods, so BaseModel keeps working;
+obj.save() and obj.delete() return the storage coroutine for the caller
+to await.
+"""
+import asyncio
+import threading
+from collections import deque
+from itertools import islice
+from os import getenv
+from sqlalchemy import func, select
+from models.base_model import Base
+from models.engine.db_storage import all_classes, load_plan, \
+    pool_options, where
+from models.engine.file_storage import FileStorage
+
+
+class AsyncFileStorage:
+    """Awaitable FileStorage: every call that may touch the disk or wait
+    on the storage lock runs in a worker thread
+
+    new() and touch() (called by BaseModel on every attribute write) do
+    not take the lock on the event loop: they are queued and applied, in
+    order, by the next awaited call before it does its own work. Calls
+    made from inside that work (objects built by reload(), for instance)
+    are applied at once. Only related(), used by the relationship
+    properties, runs on the loop.
+    """
+
+    def __init__(self):
+        """Wraps a FileStorage sharing the class-level object store"""
+        self.__storage = FileStorage()
+        self.__pending = deque()
+        self.__draining = threading.Lock()
+        self.__worker = threading.local()
+
+    async def all(self, cls=None, include=None):
+        """Returns a dictionary of the stored objects, of cls if given"""
+        return await self.__run(self.__storage.all, cls, include)
+
+    async def get(self, cls, id, include=None):
+        """Returns the object of cls with that id, or None"""
+        return await self.__run(self.__storage.get, cls, id, include)
+
+    async def filter(self, cls, include=None, **criteria):
+        """Returns the objects of cls matching criteria"""
+        return await self.__run(self.__storage.filter, cls, include,
+                                **criteria)
+
+    async def iter(self, cls=None, batch_size=1000, after=None):
+        """Yields the objects of cls (or every object) in key order,
+        fetching each batch in a worker thread"""
+        objs = self.__storage.iter(cls, batch_size, after)
+        async for obj in self.__batches(objs, batch_size):
+            yield obj
+
+    async def records(self, cls=None, batch_size=1000, since=None):
+        """Yields the file.json records of cls (or every object) in key
+        order, optionally only those updated at or after since"""
+        records = self.__storage.records(cls, batch_size, since)
+        async for record in self.__batches(records, batch_size):
+            yield record
+
+    async def count(self, cls=None):
+        """Returns the number of stored objects, of cls if given"""
+        return await self.__run(self.__storage.count, cls)
+
+    async def search(self, cls, text):
+        """Returns the objects of cls matching text, best match first"""
+        return await self.__run(self.__storage.search, cls, text)
+
+    async def near(self, latitude, longitude, radius):
+        """Returns the places within radius km of a point, nearest first"""
+        return await self.__run(self.__storage.near, latitude,
+                                longitude, radius)
+
+    async def within(self, min_lat, min_lon, max_lat, max_lon):
+        """Returns the places inside a latitude/longitude bounding box"""
+        return await self.__run(self.__storage.within, min_lat,
+                                min_lon, max_lat, max_lon)
+
+    def related(self, cls, attr, value):
+        """Returns the objects of cls whose foreign key attr equals value
+
+        This one is called by the relationship properties of the models,
+        which cannot await, so it runs (and may wait on the storage lock)
+        on the calling thread.
+        """
+        return self.__call(self.__storage.related, (cls, attr, value), {})
+
+    def new(self, obj):
+        """Queues obj to be added to the store; it is written by the next
+        save()"""
+        self.__pending.append((self.__storage.new, obj))
+
+    def touch(self, obj):
+        """Queues obj to be flagged as changed since the last save()"""
+        if getattr(self.__worker, 'busy', False):
+            self.__storage.touch(obj)
+        else:
+            self.__pending.append((self.__storage.touch, obj))
+
+    async def bulk_create(self, cls, rows, save=True):
+        """Creates an object of cls per attribute dictionary in rows and
+        saves them unless save is False; returns the number created"""
+        return await self.__run(self.__storage.bulk_create, cls,
+                                list(rows), save)
+
+    async def save(self):
+        """Writes the pending changes to the storage file"""
+        await self.__run(self.__storage.save)
+
+    async def delete(self, obj=None):
+        """Removes obj from the store"""
+        await self.__run(self.__storage.delete, obj)
+
+    async def reload(self):
+        """Loads the storage file"""
+        await self.__run(self.__storage.reload)
+
+    async def close(self):
+        """Drops the in-memory state and reloads it from the file"""
+        await self.__run(self.__storage.close)
+
+    async def __run(self, method, *args, **kwargs):
+        """Runs a FileStorage method in a worker thread"""
+        return await asyncio.to_thread(self.__call, method, args, kwargs)
+
+    def __call(self, method, args, kwargs):
+        """Applies the queued new() and touch() calls, then method"""
+        self.__worker.busy = True
+        try:
+            with self.__draining:
+                while self.__pending:
+                    queued, obj = self.__pending.popleft()
+                    queued(obj)
+            return method(*args, **kwargs)
+        finally:
+            self.__worker.busy = False
+
+    async def __batches(self, items, batch_size):
+        """Yields the items of a storage generator, advancing it a batch
+        at a time in a worker thread"""
+        while True:
+            batch = await self.__run(list, islice(items, batch_size))
+            if not batch:
+                return
+            for item in batch:
+                yield item
+
+
+class AsyncDBStorage:
+    """Awaitable database storage on the SQLAlchemy asyncio engine
+
+    Sessions are scoped to asyncio tasks: each task awaiting the storage
+    works in a session of its own and calls close() when its unit of
+    work is over. Relationships are not loaded lazily on this engine, so
+    the ones used after a read must be listed in include.
+    """
+    __engine = None
+    __session = None
+
+    def __init__(self):
+        """Instantiates a new AsyncDBStorage object"""
+        from sqlalchemy.ext.asyncio import create_async_engine
+
+        HBNB_MYSQL_USER = getenv("HBNB_MYSQL_USER")
+        HBNB_MYSQL_PWD = getenv("HBNB_MYSQL_PWD")
+        HBNB_MYSQL_HOST = getenv("HBNB_MYSQL_HOST")
+        HBNB_MYSQL_DB = getenv("HBNB_MYSQL_DB")
+
+        HBNB_USER_DETAILS = f"{HBNB_MYSQL_USER}:{HBNB_MYSQL_PWD}"
+        URL_DETAILS = f"{HBNB_USER_DETAILS}@{HBNB_MYSQL_HOST}/{HBNB_MYSQL_DB}"
+        URL = f"mysql+aiomysql://{URL_DETAILS}"
+
+        options = pool_options()
+        # the async engine brings its own (asyncio adapted) queue pool
+        del options["poolclass"]
+        self.__engine = create_async_engine(URL, **options)
+
+    async def all(self, cls=None, include=None):
+        """
+        Query all objects of cls (or of every class), eager loading the
+          relationship paths listed in include
+        """
+        new_dict = {}
+        for name, model in all_classes.items():
+            if cls is None or issubclass(model, cls):
+                stmt = select(model).options(*load_plan(model, include))
+                result = await self.__session.scalars(stmt)
+                for obj in result:
+                    new_dict[f"{name}.{obj.id}"] = obj
+        return new_dict
+
+    async def get(self, cls, id, include=None):
+        """
+        Fetch the object of cls with that id by primary key, or None
+        """
+        return await self.__session.get(
+            cls, id, options=load_plan(cls, include))
+
+    async def filter(self, cls, include=None, **criteria):
+        """
+        Query the objects of cls matching criteria, compiled to a WHERE
+          clause (see models.engine.query for the criteria syntax)
+        """
+        stmt = select(cls).options(*load_plan(cls, include)) \
+            .where(*where(cls, criteria))
+        result = await self.__session.scalars(stmt)
+        return {f"{cls.__name__}.{obj.id}": obj for obj in result}
+
+    async def count(self, cls=None):
+        """
+        Count the objects of cls (or of every class) with SQL COUNT
+        """
+        total = 0
+        for model in all_classes.values():
+            if cls is None or issubclass(model, cls):
+                total += await self.__session.scalar(
+                    select(func.count(model.id)))
+        return total
+
+    def new(self, obj):
+        """
+        Add the object to the current task's session
+        """
+        self.__session.add(obj)
+
+    def touch(self, obj):
+        """
+        Nothing to do: the session tracks changes to mapped attributes
+        """
+        pass
+
+    async def save(self):
+        """
+        Commit all changes of the current task's session
+        """
+        await self.__session.commit()
+
+    async def delete(self, obj=None):
+        """
+        Delete obj from the current task's session if not None
+        """
+        if obj:
+            await self.__session.delete(obj)
+
+    async def reload(self):
+        """
+        Create all tables in the database and create the session registry
+          (self.__session), scoped to the running asyncio task
+        """
+        from sqlalchemy.ext.asyncio import async_scoped_session, \
+            async_sessionmaker
+
+        async with self.__engine.begin() as conn:
+            if getenv("HBNB_ENV") == "test":
+                await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+        if self.__session is not None:
+            await self.__session.remove()
+        session_factory = async_sessionmaker(
+            bind=self.__engine, expire_on_commit=False)
+        self.__session = async_scoped_session(
+            session_factory, scopefunc=asyncio.current_task)
+
+    async def close(self):
+        """
+        Close the current task's session and return its connection to
+          the pool
+        """
+        await self.__session.remove()
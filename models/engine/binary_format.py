@@ -0,0 +1,110 @@
+#!/usr/bin/python3
+"""This module defines the binary snapshot format used by FileStorage
+
+A file starts with an 8 byte magic string, the marshal version its
+records were written with and the offset of its index, followed by one
+marshal-encoded record per object and, at the end, the marshal-encoded
+index mapping each key to the (offset, length) of its record. The file
+is read through mmap so a single record can be decoded without touching
+the others.
+
+marshal's format may change between Python versions, so records are
+always written with MARSHAL_VERSION, and a snapshot of another format or
+marshal version is refused with a RuntimeError rather than misread.
+
+Usage: python3 -m models.engine.binary_format to-binary file.json file.bin
+       python3 -m models.engine.binary_format to-json file.bin file.json
+"""
+import json
+import marshal
+import mmap
+import os
+import struct
+import sys
+
+MAGIC = b'HBNBBIN2'
+MARSHAL_VERSION = 4
+HEADER = struct.Struct('<8sBQ')
+
+
+def encode(record):
+    """Returns the bytes of a record dictionary"""
+    return marshal.dumps(record, MARSHAL_VERSION)
+
+
+def decode(view, offset, length):
+    """Returns the record dictionary stored at offset"""
+    return marshal.loads(view[offset:offset + length])
+
+
+def write(path, blobs):
+    """Atomically writes (key, encoded record) pairs to path"""
+    tmp_path = path + '.tmp'
+    index = {}
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, MARSHAL_VERSION, 0))
+        offset = HEADER.size
+        for key, blob in blobs:
+            f.write(blob)
+            index[key] = (offset, len(blob))
+            offset += len(blob)
+        f.write(marshal.dumps(index, MARSHAL_VERSION))
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, MARSHAL_VERSION, offset))
+    os.replace(tmp_path, path)
+
+
+def load(path):
+    """Maps the file at path and returns (mmap, index)
+
+    Raises ValueError if the file is not a binary snapshot and
+    RuntimeError if it is one of another format or marshal version.
+    """
+    with open(path, 'rb') as f:
+        header = f.read(HEADER.size)
+        if not header.startswith(MAGIC[:-1]):
+            raise ValueError('{} is not a binary snapshot'.format(path))
+        magic, version, index_offset = HEADER.unpack(
+            header.ljust(HEADER.size, b'\0'))
+        if magic != MAGIC or version != MARSHAL_VERSION:
+            raise RuntimeError(
+                '{} was written as {!r} with marshal version {}, '
+                'expected {!r} with version {}'.format(
+                    path, magic, version, MAGIC, MARSHAL_VERSION))
+        view = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return view, marshal.loads(view[index_offset:])
+
+
+def from_json(json_path, path):
+    """Converts a file.json snapshot to the binary format"""
+    from models.engine.file_storage import _RecordStream
+
+    with open(json_path, 'r') as f:
+        write(path, ((key, encode(record))
+                     for key, record in _RecordStream(f)))
+
+
+def to_json(path, json_path):
+    """Converts a binary snapshot back to the file.json format"""
+    view, index = load(path)
+    tmp_path = json_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        sep = '{'
+        for key, (offset, length) in index.items():
+            f.write(sep + json.dumps(key) + ': ' +
+                    json.dumps(decode(view, offset, length)))
+            sep = ', '
+        f.write('{}' if sep == '{' else '}')
+    view.close()
+    os.replace(tmp_path, json_path)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 4 or sys.argv[1] not in ('to-binary', 'to-json'):
+        print(__doc__.strip().splitlines()[-2].strip())
+        print(__doc__.strip().splitlines()[-1].strip())
+        sys.exit(1)
+    if sys.argv[1] == 'to-binary':
+        from_json(sys.argv[2], sys.argv[3])
+    else:
+        to_json(sys.argv[2], sys.argv[3])
@@ -1,89 +1,682 @@
 #!/usr/bin/python3
 """Defines the DBStorage engine."""
+import atexit
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
 from os import getenv
-from sqlalchemy import create_engine
+from uuid import uuid4
+from sqlalchemy import create_engine, event, func, insert, or_, inspect, \
+    select
 from models.base_model import BaseModel, Base
+from models.engine import geo, query, text_index
 from models.user import User
 from models.place import Place
 from models.state import State
 from models.city import City
 from models.amenity import Amenity
 from models.review import Review
-from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.orm import Session, sessionmaker, scoped_session, \
+    joinedload, selectinload, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
+from sqlalchemy.pool import QueuePool
 
 all_classes = {'State': State, 'City': City,
                'User': User, 'Place': Place,
                'Review': Review, 'Amenity': Amenity}
 
 
+def load_plan(cls, include):
+    """Turns dotted relationship paths into loader options for cls
+
+    A collection is loaded with selectinload, a reference with joinedload.
+    Paths whose first step cls lacks are skipped, so one plan can serve
+    every class; a later unknown step raises AttributeError.
+    """
+    options = []
+    for path in include or ():
+        names = path.split(".")
+        if not hasattr(cls, names[0]):
+            continue
+        model, option = cls, None
+        for name in names:
+            attr = getattr(model, name)
+            rel = attr.property
+            loader = selectinload if rel.uselist else joinedload
+            if option is None:
+                option = loader(attr)
+            else:
+                option = getattr(option, loader.__name__)(attr)
+            model = rel.mapper.class_
+        options.append(option)
+    return options
+
+
+def where(cls, criteria):
+    """Compiles filter() criteria on cls into SQL conditions (see
+    models.engine.query for the criteria syntax); raises ValueError on
+    an attribute that is not a column of cls"""
+    conditions = []
+    for attr, op, value in query.parse(criteria, cls):
+        column = getattr(cls, attr)
+        if op == 'in':
+            conditions.append(column.in_(value))
+        else:
+            conditions.append(query.OPERATORS[op](column, value))
+    return conditions
+
+
+class QueryCounter:
+    """Counts the SQL statements run by a thread while it is tracked"""
+
+    def __init__(self):
+        """Starts at zero"""
+        self.count = 0
+
+
+class PoolMetrics:
+    """Checkout counts and wait times of a connection pool"""
+    window = 60
+
+    def __init__(self):
+        """Starts with no checkouts"""
+        self.checkouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.recent = deque()
+
+    def record(self, wait):
+        """Counts a checkout that waited wait seconds for a connection"""
+        now = time.monotonic()
+        self.checkouts += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+        self.recent.append(now)
+        self.trim(now)
+
+    def trim(self, now):
+        """Forgets the checkouts older than the rate window"""
+        try:
+            while self.recent[0] < now - self.window:
+                self.recent.popleft()
+        except IndexError:
+            pass
+
+    def rate(self):
+        """Returns the checkouts per second over the last window"""
+        self.trim(time.monotonic())
+        return len(self.recent) / self.window
+
+
+class ObjectCache:
+    """A bounded LRU map from <class name>.<id> keys to column snapshots,
+    each expiring ttl seconds after it is stored"""
+
+    def __init__(self, size, ttl):
+        """Starts empty; a size of 0 disables the cache"""
+        self.size = size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Returns the snapshot stored under key, or None if it is
+        missing or expired"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self.entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, snapshot):
+        """Stores snapshot under key, evicting the least recently used
+        entries beyond size"""
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, snapshot)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def discard(self, key):
+        """Forgets the snapshot stored under key"""
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def stats(self):
+        """Returns the size, entry count and hit/miss/eviction counters"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": self.size,
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+
+_caches = {}  # database URL -> the ObjectCache of its storages
+
+
+class _TimedQueuePool(QueuePool):
+    """A QueuePool recording every checkout in its PoolMetrics"""
+    metrics = None
+
+    def _do_get(self):
+        """Checks a connection out, timing the wait for it"""
+        start = time.perf_counter()
+        conn = super()._do_get()
+        if self.metrics is not None:
+            self.metrics.record(time.perf_counter() - start)
+        return conn
+
+    def recreate(self):
+        """Returns a fresh pool sharing these metrics"""
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+def pool_options():
+    """Returns the create_engine() pool arguments set by the
+    HBNB_MYSQL_POOL_* and HBNB_MYSQL_PRE_PING variables"""
+    pre_ping = getenv("HBNB_MYSQL_PRE_PING", "1") == "1"
+    recycle = getenv("HBNB_MYSQL_POOL_RECYCLE", "-1" if pre_ping
+                     else "3600")
+    return {
+        "poolclass": _TimedQueuePool,
+        "pool_pre_ping": pre_ping,
+        "pool_size": int(getenv("HBNB_MYSQL_POOL_SIZE", "5")),
+        "max_overflow": int(getenv("HBNB_MYSQL_MAX_OVERFLOW", "10")),
+        "pool_timeout": float(getenv("HBNB_MYSQL_POOL_TIMEOUT", "30")),
+        "pool_recycle": int(recycle)
+    }
+
+
 class DBStorage:
     """Database storage engine."""
     __engine = None
     __session = None
+    __workers = int(getenv("HBNB_MYSQL_WORKERS", "1"))
+    __chunk_size = int(getenv("HBNB_MYSQL_CHUNK_SIZE", "1000"))
+    __commit_every = 1
+    __tracked = threading.local()
+    __cache = ObjectCache(0, 0)
 
-    def __init__(self):
-        """"Instantiates a new DBStorage object."""
-        HBNB_MYSQL_USER = getenv("HBNB_MYSQL_USER")
-        HBNB_MYSQL_PWD = getenv("HBNB_MYSQL_PWD")
-        HBNB_MYSQL_HOST = getenv("HBNB_MYSQL_HOST")
-        HBNB_MYSQL_DB = getenv("HBNB_MYSQL_DB")
+    def __init__(self, engine=None, commit_every=None):
+        """"Instantiates a new DBStorage object on engine, by default the
+        MySQL database named by the HBNB_MYSQL_* variables."""
         HBNB_ENV = getenv("HBNB_ENV")
 
-        HBNB_USER_DETAILS = f"{HBNB_MYSQL_USER}:{HBNB_MYSQL_PWD}"
-        URL_DETAILS = f"{HBNB_USER_DETAILS}@{HBNB_MYSQL_HOST}/{HBNB_MYSQL_DB}"
-        URL = f"mysql+mysqldb://{URL_DETAILS}"
+        if engine is None:
+            HBNB_MYSQL_USER = getenv("HBNB_MYSQL_USER")
+            HBNB_MYSQL_PWD = getenv("HBNB_MYSQL_PWD")
+            HBNB_MYSQL_HOST = getenv("HBNB_MYSQL_HOST")
+            HBNB_MYSQL_DB = getenv("HBNB_MYSQL_DB")
 
-        self.__engine = create_engine(
-            URL, pool_pre_ping=True)
+            HBNB_USER_DETAILS = f"{HBNB_MYSQL_USER}:{HBNB_MYSQL_PWD}"
+            URL_DETAILS = \
+                f"{HBNB_USER_DETAILS}@{HBNB_MYSQL_HOST}/{HBNB_MYSQL_DB}"
+            URL = f"mysql+mysqldb://{URL_DETAILS}"
+            engine = create_engine(URL, **pool_options())
+
+        self.__engine = engine
+        self.__engine.pool.metrics = PoolMetrics()
+        size = int(getenv("HBNB_MYSQL_CACHE_SIZE", "0"))
+        if size:
+            self.__cache = _caches.setdefault(
+                self.__engine.url.render_as_string(),
+                ObjectCache(size, float(getenv("HBNB_MYSQL_CACHE_TTL",
+                                               "60"))))
+        event.listen(self.__engine, "before_cursor_execute",
+                     self.__count_query)
+        self.__commit_every = commit_every or \
+            int(getenv("HBNB_MYSQL_COMMIT_EVERY", "1"))
+        if self.__commit_every > 1:
+            atexit.register(self.close)
 
         if HBNB_ENV == "test":
             Base.metadata.drop_all(self.__engine)
 
-    def all(self, cls=None):
+    def all(self, cls=None, include=None):
         """
         Query on the current database session (self.__session) all objects
-          depending on the class name (argument cls)
+          depending on the class name (argument cls), eager loading the
+          relationship paths listed in include (see load_plan). With
+          HBNB_MYSQL_WORKERS > 1 and nothing pending in the session, the
+          tables are loaded concurrently on pooled connections; building
+          the objects holds the GIL, so this only pays off when round
+          trips to a remote server dominate (benchmarks/db_all.py on a
+          SQLite file, 110000 rows: 0.97 s sequential, 1.95 s with 6
+          workers)
         """
-        new_dict = {}
         if cls:
-            objs = self.__session.query(cls).all()
-            for obj in objs:
-                key = f"{obj.__class__.__name__}.{obj.id}"
-                new_dict[key] = obj
-        else:
-            for cls in all_classes.values():
-                objs = self.__session.query(cls).all()
-                for obj in objs:
-                    key = f"{obj.__class__.__name__}.{obj.id}"
-                    new_dict[key] = obj
+            return self.__keyed(cls.__name__, self.__query(cls, include))
+        session = self.__session
+        if self.__workers < 2 or session.new or session.dirty or \
+                session.deleted:
+            new_dict = {}
+            for name, model in all_classes.items():
+                new_dict.update(self.__keyed(name,
+                                             self.__query(model, include)))
+            return new_dict
+        with ThreadPoolExecutor(min(self.__workers, len(all_classes))) as pool:
+            tables = list(pool.map(self.__load_table, all_classes.items(),
+                                   [include] * len(all_classes)))
+        new_dict = {}
+        for objs in tables:
+            for key, obj in objs.items():
+                objs[key] = self.__attach(obj)
+            new_dict.update(objs)
         return new_dict
 
+    def iter(self, cls=None, batch_size=1000, after=None):
+        """
+        Stream the objects of cls (or of every class) in key order with a
+          server-side cursor, fetching batch_size rows at a time and
+          starting after the key given as after
+        """
+        after_name, _, after_id = (after or '').partition('.')
+        for name in sorted(all_classes):
+            model = all_classes[name]
+            if cls is not None and not issubclass(model, cls):
+                continue
+            if after is not None and name < after_name:
+                continue
+            objs = self.__session.query(model).order_by(model.id)
+            if after is not None and name == after_name:
+                objs = objs.filter(model.id > after_id)
+            yield from objs.yield_per(batch_size)
+
+    def records(self, cls=None, batch_size=1000, since=None):
+        """
+        Stream the rows of cls (or of every class) in key order as
+          to_dict() style dictionaries, reading plain rows through a
+          server-side cursor without building objects; since keeps the
+          rows updated at or after it (an aware since is converted to the
+          naive local time the timestamps are stored in)
+        """
+        if since is not None and since.tzinfo is not None:
+            since = since.astimezone().replace(tzinfo=None)
+        for name in sorted(all_classes):
+            model = all_classes[name]
+            if cls is not None and not issubclass(model, cls):
+                continue
+            table = model.__table__
+            rows = select(table).order_by(table.c.id)
+            if since is not None:
+                rows = rows.where(table.c.updated_at >= since)
+            result = self.__session.execute(
+                rows, execution_options={"yield_per": batch_size})
+            for row in result.mappings():
+                record = dict(row)
+                record["__class__"] = name
+                record["created_at"] = record["created_at"].isoformat()
+                record["updated_at"] = record["updated_at"].isoformat()
+                yield record
+
+    def get(self, cls, id, include=None):
+        """
+        Retrieve one object of cls by primary key, or None; with
+          HBNB_MYSQL_CACHE_SIZE > 0 it is read through the ObjectCache
+          shared by the storages of the same database, whose entries may
+          miss writes of other processes for HBNB_MYSQL_CACHE_TTL seconds
+        """
+        if cls not in all_classes.values():
+            return None
+        session = self.__session
+        if include or not self.__cache.size:
+            return session.get(cls, id, options=load_plan(cls, include))
+        key = f"{cls.__name__}.{id}"
+        snapshot = self.__cache.get(key)
+        if snapshot is not None:
+            held = session.identity_map.get(identity_key(cls, id))
+            return held if held is not None else self.__revive(cls, snapshot)
+        obj = session.get(cls, id)
+        if obj is not None and not session.is_modified(obj) and \
+                key not in session.info.get("stale", ()):
+            self.__cache.put(key, {attr.key: getattr(obj, attr.key)
+                                   for attr in inspect(cls).column_attrs})
+        return obj
+
+    def filter(self, cls, include=None, **criteria):
+        """
+        Query the objects of cls matching criteria, compiled to a WHERE
+          clause (see models.engine.query for the criteria syntax)
+        """
+        objs = self.__query(cls, include).filter(*where(cls, criteria))
+        return self.__keyed(cls.__name__, objs)
+
+    def near(self, latitude, longitude, radius):
+        """
+        Query the places within radius km of a point, nearest first: the
+          bounding box is filtered in SQL, the exact distance in Python
+        """
+        ranked = []
+        for box in geo.boxes(latitude, longitude, radius):
+            for place in self.within(*box).values():
+                dist = geo.distance(latitude, longitude,
+                                    place.latitude, place.longitude)
+                if dist <= radius:
+                    ranked.append((dist, place))
+        ranked.sort(key=lambda item: item[0])
+        return [place for dist, place in ranked]
+
+    def within(self, min_lat, min_lon, max_lat, max_lon):
+        """
+        Query the places inside a latitude/longitude bounding box
+        """
+        return self.filter(Place, latitude__gte=min_lat,
+                           latitude__lte=max_lat, longitude__gte=min_lon,
+                           longitude__lte=max_lon)
+
+    def search(self, cls, text):
+        """
+        Query the objects of cls whose text columns contain any term of
+          text, then rank them with a full-text index over those rows
+        """
+        terms = sorted(set(text_index.tokenize(text)))
+        index = text_index.TextIndex()
+        objs = {}
+        for name, attrs in text_index.FIELDS.items():
+            model = all_classes[name]
+            if not terms or not issubclass(model, cls):
+                continue
+            rows = self.__session.query(model).filter(or_(*[
+                func.lower(getattr(model, attr)).contains(
+                    term, autoescape=True)
+                for attr in attrs for term in terms]))
+            for obj in rows:
+                key = f"{name}.{obj.id}"
+                objs[key] = obj
+                index.add(key, text_index.document(obj.__dict__, attrs))
+        return [objs[key] for key in index.search(text)]
+
+    def count(self, cls=None):
+        """
+        Count the objects of cls (or of every class) with SQL COUNT
+        """
+        total = 0
+        for model in all_classes.values():
+            if cls is None or issubclass(model, cls):
+                total += self.__session.query(func.count(model.id)).scalar()
+        return total
+
     def new(self, obj):
         """
         Add the object to the current database session (self.__session)
         """
+        self.__cache.discard(self.__key(obj))
         self.__session.add(obj)
 
+    def new_many(self, objs):
+        """
+        Add several objects to the current database session; they are
+          flushed with batched INSERTs
+        """
+        self.__session.add_all(objs)
+
+    def bulk_create(self, cls, rows, chunk_size=None, save=True):
+        """
+        Insert a row of cls per attribute dictionary in rows with Core
+          executemany, chunk_size rows (HBNB_MYSQL_CHUNK_SIZE) per
+          statement, then commit unless save is False; returns the number
+          of rows inserted. No objects are built. The rows are inserted
+          under a savepoint: if one fails, none of them is kept, but the
+          session keeps the changes made before the call
+        """
+        chunk_size = chunk_size or self.__chunk_size
+        table = cls.__table__
+        total = 0
+        chunk = []
+        with self.__session.begin_nested():
+            for row in rows:
+                chunk.append(self.__row(table, row))
+                if len(chunk) >= chunk_size:
+                    self.__session.execute(insert(table), chunk)
+                    total += len(chunk)
+                    chunk = []
+            if chunk:
+                self.__session.execute(insert(table), chunk)
+                total += len(chunk)
+        if save:
+            self.__commit()
+        return total
+
+    def touch(self, obj):
+        """
+        Nothing to do: the session tracks changes to mapped attributes
+        """
+        pass
+
     def save(self):
         """
-        Commit all changes of the current database session (self.__session)
+        Commit all changes of the current database session (self.__session);
+          with HBNB_MYSQL_COMMIT_EVERY=n > 1 only every n-th save() of the
+          session commits, the others flush, so the session reads its own
+          changes while other sessions see them once their batch commits
         """
-        self.__session.commit()
+        pending = self.__session.info.get("pending", 0) + 1
+        if pending < self.__commit_every:
+            self.__session.flush()
+            self.__session.info["pending"] = pending
+        else:
+            self.__commit()
 
     def delete(self, obj=None):
         """
         Delete from the current database session obj if not None
         """
         if obj:
+            self.__cache.discard(self.__key(obj))
             self.__session.delete(obj)
 
     def reload(self):
         """
-        Create all tables in the database and create the current database
-          session (self.__session)
+        Create all tables in the database and create the session registry
+          (self.__session): every thread using the storage works in a
+          session of its own, opened on first use
         """
         Base.metadata.create_all(self.__engine)
+        if self.__session is not None:
+            self.__session.remove()
         session_factory = sessionmaker(
             bind=self.__engine, expire_on_commit=False)
-        Session = scoped_session(session_factory)
-        self.__session = Session()
+        event.listen(session_factory, "after_flush", self.__flushed)
+        event.listen(session_factory, "after_commit", self.__committed)
+        event.listen(session_factory, "after_rollback", self.__committed)
+        self.__session = scoped_session(session_factory)
+
+    @contextmanager
+    def begin(self):
+        """
+        Run a unit of work in the calling thread's session: commit it if
+          the block succeeds, roll it back if it raises, and close the
+          session either way
+        """
+        try:
+            yield self
+            self.__commit()
+        except BaseException:
+            self.__session.rollback()
+            raise
+        finally:
+            self.close()
+
+    def close(self):
+        """
+        Close the calling thread's session and return its connection to
+          the pool; the thread gets a fresh session on its next call.
+          Saves still waiting for their batch are committed first. With
+          HBNB_MYSQL_COMMIT_EVERY > 1 a close() also runs at exit, but
+          only for the main thread's session: other threads must close()
+          before they end or lose their batch
+        """
+        if self.__session is None:
+            return
+        if self.__session.info.get("pending"):
+            self.__commit()
+        self.__session.remove()
+
+    def pool_metrics(self):
+        """
+        Report the connection pool usage: connections checked out and in,
+          overflow in use, total checkouts, checkouts per second over the
+          last minute and the average and longest checkout wait
+        """
+        pool = self.__engine.pool
+        metrics = getattr(pool, "metrics", None) or PoolMetrics()
+        checkouts = metrics.checkouts
+        return {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(0, pool.overflow()),
+            "checkouts": checkouts,
+            "checkouts_per_sec": metrics.rate(),
+            "wait_avg_ms": (metrics.wait_total / checkouts * 1000
+                            if checkouts else 0.0),
+            "wait_max_ms": metrics.wait_max * 1000
+        }
+
+    def cache_stats(self):
+        """
+        Report the object cache size, entry count, hits, misses, LRU
+          evictions and hit rate
+        """
+        return self.__cache.stats()
+
+    @contextmanager
+    def track_queries(self):
+        """
+        Count the SQL statements the calling thread runs inside the block
+          with a QueryCounter, e.g. to check what a request costs
+        """
+        counter = QueryCounter()
+        counters = self.__tracked.__dict__.setdefault("counters", [])
+        counters.append(counter)
+        try:
+            yield counter
+        finally:
+            counters.remove(counter)
+
+    def __commit(self):
+        """
+        Commit the current session and start a new commit batch
+        """
+        self.__session.commit()
+        self.__session.info["pending"] = 0
+
+    def __key(self, obj):
+        """
+        Return the <class name>.<id> key of obj
+        """
+        return f"{type(obj).__name__}.{obj.id}"
+
+    def __revive(self, cls, snapshot):
+        """
+        Rebuild an object of cls from a cached column snapshot and add it
+          to the current session as if it had just been loaded
+        """
+        obj = inspect(cls).class_manager.new_instance()
+        for name, value in snapshot.items():
+            set_committed_value(obj, name, value)
+        make_transient_to_detached(obj)
+        self.__session.add(obj)
+        return obj
+
+    def __flushed(self, session, flush_context):
+        """
+        Drop the objects a session just wrote from the cache; they are
+          dropped again once the session commits, as another session may
+          have cached the old row in between
+        """
+        stale = session.info.setdefault("stale", set())
+        for obj in [*session.new, *session.dirty, *session.deleted]:
+            key = self.__key(obj)
+            self.__cache.discard(key)
+            stale.add(key)
+
+    def __committed(self, session):
+        """
+        Drop again the objects a session wrote once it commits or rolls
+          back
+        """
+        for key in session.info.pop("stale", ()):
+            self.__cache.discard(key)
+
+    def __count_query(self, *args):
+        """
+        Bump the counters tracked by the thread running a statement
+        """
+        for counter in getattr(self.__tracked, "counters", ()):
+            counter.count += 1
+
+    def __query(self, cls, include, session=None):
+        """
+        Start a query on cls carrying the load plan include
+        """
+        session = session or self.__session
+        return session.query(cls).options(*load_plan(cls, include))
+
+    def __row(self, table, row):
+        """
+        Fill in the id and timestamps of a row of table the way BaseModel
+          does, and its other missing columns with their defaults, so
+          that rows of one executemany all bind the same parameters
+        """
+        row = dict(row)
+        row.pop("__class__", None)
+        now = datetime.now()
+        for name in ("created_at", "updated_at"):
+            if isinstance(row.get(name), str):
+                row[name] = datetime.strptime(row[name],
+                                              "%Y-%m-%dT%H:%M:%S.%f")
+            row.setdefault(name, now)
+        row.setdefault("id", str(uuid4()))
+        for column in table.columns:
+            if column.name not in row:
+                default = column.default
+                row[column.name] = default.arg if default is not None \
+                    and default.is_scalar else None
+        return row
+
+    def __keyed(self, name, objs):
+        """
+        Key the objects of the class called name by <name>.<id>
+        """
+        prefix = name + "."
+        return {prefix + obj.id: obj for obj in objs}
+
+    def __load_table(self, item, include):
+        """
+        Load every row of one class on a pooled connection of its own;
+          the objects come back detached
+        """
+        name, model = item
+        with Session(self.__engine, expire_on_commit=False) as session:
+            return self.__keyed(name, self.__query(model, include, session))
+
+    def __attach(self, obj):
+        """
+        Merge a detached object, and the relationships loaded with it,
+          into the current session without a query; returns the instance
+          the session holds for its row, which rows loaded by other
+          tables share
+        """
+        return self.__session.merge(obj, load=False)
@@ -1,66 +1,1290 @@
 #!/usr/bin/python3
 """This module defines a class to manage file storage for hbnb clone"""
+import atexit
+import bisect
+import functools
 import json
 import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from math import floor
+from os import getenv
+from models.engine import binary_format, geo, query, text_index
+
+
+class _Record:
+    """A stored object that has not been built from its record yet"""
+    __slots__ = ('cls',)
+
+    def build(self):
+        """Returns a model instance made from the record"""
+        return self.cls(**self.record)
+
+
+class _DictRecord(_Record):
+    """A stored object kept as its decoded record dictionary"""
+    __slots__ = ('record',)
+
+    def __init__(self, cls, record):
+        """Keeps the model class and the decoded record of an object"""
+        self.cls = cls
+        self.record = record
+
+
+class _RecordTable:
+    """The column layout shared by the compact records of one class"""
+    __slots__ = ('columns', 'positions')
+
+    def __init__(self):
+        """Starts with no columns"""
+        self.columns = []
+        self.positions = {}
+
+    def position(self, name):
+        """Returns the column index of an attribute, adding it if new"""
+        if name not in self.positions:
+            self.positions[name] = len(self.columns)
+            self.columns.append(name)
+        return self.positions[name]
+
+
+class _CompactRecord(_Record):
+    """A stored object kept as a tuple of column values
+
+    Columns are shared per class through a _RecordTable, foreign-key
+    strings are interned and timestamps are held as integer microseconds
+    since the epoch.
+    """
+    __slots__ = ('table', 'values')
+    _MISSING = object()
+    _EPOCH = datetime(1970, 1, 1)
+    _TICK = timedelta(microseconds=1)
+
+    def __init__(self, cls, table, record):
+        """Packs a decoded record into the columns of table"""
+        self.cls = cls
+        self.table = table
+        values = [_CompactRecord._MISSING] * len(table.columns)
+        for name, value in record.items():
+            if name == '__class__':
+                continue
+            if name in ('created_at', 'updated_at'):
+                value = self.__pack_time(value)
+            elif name.endswith('_id') and type(value) is str:
+                value = sys.intern(value)
+            pos = table.position(name)
+            if pos >= len(values):
+                values.extend([_CompactRecord._MISSING] *
+                              (pos + 1 - len(values)))
+            values[pos] = value
+        self.values = tuple(values)
+
+    @property
+    def record(self):
+        """Unpacks the record dictionary"""
+        record = {'__class__': self.cls.__name__}
+        for name, value in zip(self.table.columns, self.values):
+            if value is _CompactRecord._MISSING:
+                continue
+            if name in ('created_at', 'updated_at') and type(value) is int:
+                value = (_CompactRecord._EPOCH +
+                         value * _CompactRecord._TICK).isoformat()
+            record[name] = value
+        return record
+
+    @staticmethod
+    def __pack_time(value):
+        """Returns a timestamp string as microseconds when lossless"""
+        try:
+            ticks = (datetime.fromisoformat(value) - _CompactRecord._EPOCH) \
+                // _CompactRecord._TICK
+        except (TypeError, ValueError):
+            return value
+        if (_CompactRecord._EPOCH + ticks * _CompactRecord._TICK) \
+                .isoformat() != value:
+            return value
+        return ticks
+
+
+class _MappedRecord(_Record):
+    """A stored object whose record is still in a mapped binary file"""
+    __slots__ = ('view', 'offset', 'length')
+
+    def __init__(self, cls, view, offset, length):
+        """Keeps the model class and the location of the record"""
+        self.cls = cls
+        self.view = view
+        self.offset = offset
+        self.length = length
+
+    @property
+    def record(self):
+        """Decodes the record from the mapped file"""
+        return binary_format.decode(self.view, self.offset, self.length)
+
+    def blob(self):
+        """Returns the encoded record without decoding it"""
+        return self.view[self.offset:self.offset + self.length]
+
+
+class _HashIndex:
+    """The keys of the objects holding each value of one attribute"""
+    __slots__ = ('keys',)
+
+    def __init__(self):
+        """Starts empty"""
+        self.keys = {}
+
+    def add(self, value, key):
+        """Files key under value"""
+        self.keys.setdefault(value, set()).add(key)
+
+    def add_many(self, pairs):
+        """Files each (value, key) pair"""
+        for value, key in pairs:
+            self.add(value, key)
+
+    def remove(self, value, key):
+        """Unfiles key from value"""
+        keys = self.keys[value]
+        keys.discard(key)
+        if not keys:
+            del self.keys[value]
+
+    def lookup(self, op, value):
+        """Returns the keys matching an eq or in condition, else None"""
+        if op not in ('eq', 'in'):
+            return None
+        keys = set()
+        for item in (value if op == 'in' else [value]):
+            keys.update(self.keys.get(item, ()))
+        return keys
+
+
+class _SortedIndex:
+    """The keys of the objects ordered by a numeric attribute
+
+    values and keys are parallel lists kept sorted with bisect; objects
+    whose attribute is not a number are left out.
+    """
+    __slots__ = ('values', 'keys')
+
+    def __init__(self):
+        """Starts empty"""
+        self.values = []
+        self.keys = []
+
+    @staticmethod
+    def indexable(value):
+        """Tells whether value can be ordered in the index"""
+        return type(value) in (int, float)
+
+    def add(self, value, key):
+        """Inserts key at the position of value"""
+        if self.indexable(value):
+            pos = bisect.bisect_right(self.values, value)
+            self.values.insert(pos, value)
+            self.keys.insert(pos, key)
+
+    def add_many(self, pairs):
+        """Merges (value, key) pairs into the index with a single sort"""
+        merged = list(zip(self.values, self.keys))
+        merged.extend(pair for pair in pairs if self.indexable(pair[0]))
+        merged.sort(key=lambda pair: pair[0])
+        self.values = [value for value, key in merged]
+        self.keys = [key for value, key in merged]
+
+    def remove(self, value, key):
+        """Removes key from the position of value"""
+        if self.indexable(value):
+            lo = bisect.bisect_left(self.values, value)
+            hi = bisect.bisect_right(self.values, value)
+            pos = self.keys.index(key, lo, hi)
+            del self.values[pos]
+            del self.keys[pos]
+
+    def lookup(self, op, value):
+        """Returns the keys matching a comparison, else None"""
+        bounds = {
+            'eq': (bisect.bisect_left, bisect.bisect_right),
+            'gt': (bisect.bisect_right, None),
+            'gte': (bisect.bisect_left, None),
+            'lt': (None, bisect.bisect_left),
+            'lte': (None, bisect.bisect_right)
+        }
+        if op not in bounds or not self.indexable(value):
+            return None
+        lower, upper = bounds[op]
+        lo = lower(self.values, value) if lower else 0
+        hi = upper(self.values, value) if upper else len(self.values)
+        return set(self.keys[lo:hi])
+
+
+class _GridIndex:
+    """The keys of the objects bucketed on a latitude/longitude grid"""
+    __slots__ = ('cells', 'size')
+
+    def __init__(self, size=0.1):
+        """Starts empty, with square cells of size degrees"""
+        self.cells = {}
+        self.size = size
+
+    def cell(self, latitude, longitude):
+        """Returns the grid cell of a point"""
+        return (floor(latitude / self.size), floor(longitude / self.size))
+
+    @staticmethod
+    def indexable(value):
+        """Tells whether value is a (latitude, longitude) pair of numbers"""
+        return all(type(part) in (int, float) for part in value)
+
+    def add(self, value, key):
+        """Files key in the cell of the point value"""
+        if self.indexable(value):
+            self.cells.setdefault(self.cell(*value), set()).add(key)
+
+    def add_many(self, pairs):
+        """Files each (value, key) pair"""
+        for value, key in pairs:
+            self.add(value, key)
+
+    def remove(self, value, key):
+        """Unfiles key from the cell of the point value"""
+        if self.indexable(value):
+            cell = self.cell(*value)
+            self.cells[cell].discard(key)
+            if not self.cells[cell]:
+                del self.cells[cell]
+
+    def lookup(self, op, value):
+        """Grid indexes do not answer filter() conditions"""
+        return None
+
+    def box(self, min_lat, min_lon, max_lat, max_lon):
+        """Returns the keys in the cells overlapping a bounding box"""
+        low = self.cell(min_lat, min_lon)
+        high = self.cell(max_lat, max_lon)
+        keys = set()
+        if (high[0] - low[0] + 1) * (high[1] - low[1] + 1) > len(self.cells):
+            for (row, col), cell_keys in self.cells.items():
+                if low[0] <= row <= high[0] and low[1] <= col <= high[1]:
+                    keys.update(cell_keys)
+            return keys
+        for row in range(low[0], high[0] + 1):
+            for col in range(low[1], high[1] + 1):
+                keys.update(self.cells.get((row, col), ()))
+        return keys
+
+
+class _ReadWriteLock:
+    """A lock shared by readers and held by at most one writer
+
+    Waiting writers hold back new readers so a stream of reads cannot
+    starve them. A thread already reading may read again and the writer
+    may read or write again, but a reader cannot become the writer.
+    """
+
+    def __init__(self):
+        """Starts unlocked"""
+        self.cond = threading.Condition()
+        self.readers = 0
+        self.waiting = 0
+        self.writer = None
+        self.local = threading.local()
+
+    @contextmanager
+    def read(self):
+        """Holds the lock shared with other readers"""
+        depth = getattr(self.local, 'depth', 0)
+        if self.writer == threading.get_ident():
+            yield
+            return
+        if not depth:
+            with self.cond:
+                while self.writer is not None or self.waiting:
+                    self.cond.wait()
+                self.readers += 1
+        self.local.depth = depth + 1
+        try:
+            yield
+        finally:
+            self.local.depth = depth
+            if not depth:
+                with self.cond:
+                    self.readers -= 1
+                    if not self.readers:
+                        self.cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        """Holds the lock exclusively"""
+        me = threading.get_ident()
+        if self.writer == me:
+            yield
+            return
+        if getattr(self.local, 'depth', 0):
+            raise RuntimeError('cannot write to storage while reading it')
+        with self.cond:
+            self.waiting += 1
+            try:
+                while self.writer is not None or self.readers:
+                    self.cond.wait()
+            finally:
+                self.waiting -= 1
+            self.writer = me
+        try:
+            yield
+        finally:
+            with self.cond:
+                self.writer = None
+                self.cond.notify_all()
+
+
+_lock = _ReadWriteLock()
+_build_lock = threading.RLock()
+
+
+def _reads(method):
+    """Runs a FileStorage method holding the shared read lock"""
+    @functools.wraps(method)
+    def locked(self, *args, **kwargs):
+        """Calls method under the read lock"""
+        with _lock.read():
+            return method(self, *args, **kwargs)
+    return locked
+
+
+def _writes(method):
+    """Runs a FileStorage method holding the exclusive write lock"""
+    @functools.wraps(method)
+    def locked(self, *args, **kwargs):
+        """Calls method under the write lock"""
+        with _lock.write():
+            return method(self, *args, **kwargs)
+    return locked
+
+
+class _LazyObjects(dict):
+    """A dictionary of stored objects that builds records on access"""
+
+    def __getitem__(self, key):
+        """Returns the object under key, building it if needed"""
+        value = dict.__getitem__(self, key)
+        if isinstance(value, _Record):
+            with _build_lock:
+                value = dict.__getitem__(self, key)
+                if isinstance(value, _Record):
+                    value = value.build()
+                    dict.__setitem__(self, key, value)
+        return value
+
+    def __iter__(self):
+        """Iterates over a snapshot of the keys (also routes dict copies
+        via __getitem__)"""
+        return iter(list(dict.keys(self)))
+
+    def get(self, key, default=None):
+        """Returns the object under key, or default"""
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def values(self):
+        """Returns the objects, building all pending records"""
+        self.build()
+        return list(dict.values(self))
+
+    def items(self):
+        """Returns the items, building all pending records"""
+        self.build()
+        return list(dict.items(self))
+
+    def copy(self):
+        """Returns a plain dict of built objects"""
+        return dict(self.items())
+
+    def build(self):
+        """Builds every object still held as a record
+
+        This runs without the storage lock (all() hands out the live
+        mapping), so keys deleted meanwhile are skipped.
+        """
+        for key, value in list(dict.items(self)):
+            if isinstance(value, _Record):
+                self.get(key)  # builds and stores the object
+
+
+class _RecordStream:
+    """Decodes a {key: record, ...} JSON file one record at a time
+
+    Only the chunk being scanned and the record being decoded are held in
+    memory, never the whole document.
+    """
+
+    def __init__(self, f, chunk_size=1 << 16):
+        """Wraps an open text file"""
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buf = ''
+        self.pos = 0
+
+    def __iter__(self):
+        """Yields the (key, record) pairs of the top-level object"""
+        self.__expect('{')
+        if self.__peek() == '}':
+            return
+        while True:
+            self.__check('"')
+            key = self.__decode()
+            self.__expect(':')
+            self.__check('{')
+            yield key, self.__decode()
+            if self.__expect(',}') == '}':
+                return
+
+    def __more(self):
+        """Reads the next chunk, dropping what has been consumed"""
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def __peek(self):
+        """Returns the next non-blank character, or '' at end of file"""
+        while True:
+            while self.pos < len(self.buf) and \
+                    self.buf[self.pos] in ' \t\n\r':
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.__more():
+                return ''
+
+    def __check(self, chars):
+        """Raises JSONDecodeError unless the next character is in chars"""
+        char = self.__peek()
+        if not char or char not in chars:
+            raise json.JSONDecodeError(
+                'Expecting one of ' + repr(chars), self.buf, self.pos)
+        return char
+
+    def __expect(self, chars):
+        """Consumes the next character, which must be in chars"""
+        char = self.__check(chars)
+        self.pos += 1
+        return char
+
+    def __decode(self):
+        """Decodes the JSON value at the cursor, reading more as needed"""
+        while True:
+            try:
+                value, self.pos = self.decoder.raw_decode(self.buf, self.pos)
+                return value
+            except json.JSONDecodeError:
+                if not self.__more():
+                    raise
+
+
+def _read_shard(path):
+    """Returns the (key, record) pairs of one shard file"""
+    try:
+        with open(path, 'r') as f:
+            return list(_RecordStream(f))
+    except (FileNotFoundError, json.JSONDecodeError):
+        return []
 
 
 class FileStorage:
     """This class manages storage of hbnb models in JSON format"""
     __file_path = 'file.json'
-    __objects = {}
+    __objects = _LazyObjects()
+    __journal = getenv('HBNB_FILE_JOURNAL') == '1'
+    __lazy = getenv('HBNB_FILE_LAZY') == '1'
+    __compact = getenv('HBNB_FILE_COMPACT') == '1'
+    __tables = {}
+    __layout = getenv('HBNB_FILE_LAYOUT', 'json')
+    __workers = int(getenv('HBNB_FILE_WORKERS', '1'))
+    __parallel_min_bytes = 1 << 20
+    __unloaded = set()
+    __models = {}
+    __compact_threshold = int(getenv('HBNB_FILE_COMPACT_AT', '1000'))
+    __journal_size = 0
+    __dirty = set()
+    __removed = set()
+    __cache = {}
+    __blobs = {}
+    __classes = {}
+    __indexes = {}
+    __indexed = {}
+    __text = None
+    __retext = set()
+    __text_at_exit = False
+
+    @_reads
+    def all(self, cls=None, include=None):
+        """Returns a dictionary of models currently in storage
 
-    def all(self, cls=None):
-        """Returns a dictionary of models currently in storage"""
+        include is accepted for parity with DBStorage: relationships are
+        answered from the foreign key indexes, without a query per parent.
+        """
+        self.__require(cls)
         if cls is not None:
-            return {key: value for key, value in FileStorage.__objects.items()
-                    if isinstance(value, cls)}
+            objs = {}
+            for key in self.__keys_of(cls):
+                objs[key] = FileStorage.__objects[key]
+            return objs
         else:
             return FileStorage.__objects
 
+    def iter(self, cls=None, batch_size=1000, after=None):
+        """Yields the objects of cls (or every object) in key order
+
+        Only the keys are sorted up front; objects are fetched batch_size
+        keys at a time, starting after the key given as after, so records
+        kept lazily are built one by one as the caller consumes them.
+        The read lock is only held while a batch is fetched.
+        """
+        keys = self.__sorted_keys(cls)
+        start = bisect.bisect_right(keys, after) if after is not None else 0
+        for first in range(start, len(keys), batch_size):
+            with _lock.read():
+                objs = [FileStorage.__objects.get(key)
+                        for key in keys[first:first + batch_size]]
+            for obj in objs:
+                if obj is not None:
+                    yield obj
+
+    def records(self, cls=None, batch_size=1000, since=None):
+        """Yields the file.json records of cls (or every object) in key
+        order, optionally only those updated at or after since
+
+        Records kept lazily are read without building their objects. The
+        timestamps are naive local times, so an aware since is converted
+        to local time.
+        """
+        if since is not None and since.tzinfo is not None:
+            since = since.astimezone().replace(tzinfo=None)
+        keys = self.__sorted_keys(cls)
+        for first in range(0, len(keys), batch_size):
+            with _lock.read():
+                objs = [dict.get(FileStorage.__objects, key)
+                        for key in keys[first:first + batch_size]]
+                records = [dict(obj.record) if isinstance(obj, _Record)
+                           else obj.to_dict()
+                           for obj in objs if obj is not None]
+            for record in records:
+                if since is not None and \
+                        datetime.fromisoformat(record['updated_at']) < since:
+                    continue
+                yield record
+
+    @_reads
+    def get(self, cls, id, include=None):
+        """Returns the object of cls with the given id, or None"""
+        self.__require(cls)
+        return FileStorage.__objects.get(cls.__name__ + '.' + str(id))
+
+    @_reads
+    def count(self, cls=None):
+        """Returns the number of stored objects, optionally of one class"""
+        self.__require(cls)
+        if cls is None:
+            return len(FileStorage.__objects)
+        buckets = list(FileStorage.__classes.items())
+        return sum(len(bucket) for bucket_cls, bucket in buckets
+                   if issubclass(bucket_cls, cls))
+
+    @_writes
     def new(self, obj):
         """Adds new object to storage dictionary"""
-        self.all().update({obj.to_dict()['__class__'] + '.' + obj.id: obj})
+        self.__require(type(obj))
+        key = obj.__class__.__name__ + '.' + obj.id
+        self.__add(key, obj)
+        FileStorage.__dirty.add(key)
+        FileStorage.__removed.discard(key)
+
+    @_writes
+    def new_many(self, objs):
+        """Adds several objects to storage, filing them in each index in
+        one pass instead of once per object"""
+        fresh = {}
+        for obj in objs:
+            key = obj.__class__.__name__ + '.' + obj.id
+            self.__require(type(obj))
+            if key in FileStorage.__objects:
+                self.new(obj)
+            else:
+                fresh[key] = obj
+        dict.update(FileStorage.__objects, fresh)
+        for key, obj in fresh.items():
+            FileStorage.__classes.setdefault(type(obj), set()).add(key)
+            self.__mark_text(key)
+        FileStorage.__dirty.update(fresh)
+        FileStorage.__removed.difference_update(fresh)
+        self.__index_many(fresh)
+
+    @_writes
+    def bulk_create(self, cls, rows, save=True):
+        """Creates an object of cls per attribute dictionary in rows and
+        saves them once, unless save is False (so that several batches
+        share one save); returns the number of objects created"""
+        objs = [cls(**row) for row in rows]
+        self.new_many(objs)
+        if save:
+            self.save()
+        return len(objs)
 
+    def touch(self, obj):
+        """Flags a stored object as changed since the last save"""
+        key = "{}.{}".format(obj.__class__.__name__, obj.__dict__.get('id'))
+        if dict.get(FileStorage.__objects, key) is obj:
+            with _lock.write():
+                # a delete() may have run while waiting for the lock
+                if dict.get(FileStorage.__objects, key) is not obj:
+                    return
+                FileStorage.__dirty.add(key)
+                self.__index(key, obj)
+                self.__mark_text(key)
+
+    @_reads
+    def related(self, cls, attr, value):
+        """Returns the objects of cls whose foreign key attr equals value
+
+        Foreign key columns are answered from a reverse index, so the cost
+        is proportional to the number of matching children.
+        """
+        self.__require(cls)
+        index = self.__find_index(cls, attr)
+        if not isinstance(index, _HashIndex):
+            return [obj for obj in self.all(cls).values()
+                    if getattr(obj, attr, None) == value]
+        objs = []
+        for key in index.lookup('eq', value):
+            obj = FileStorage.__objects[key]
+            if getattr(obj, attr, None) == value:
+                objs.append(obj)
+        return objs
+
+    @_reads
+    def filter(self, cls, include=None, **criteria):
+        """Returns the objects of cls matching criteria (see query)
+
+        Conditions an index can answer (equality and in on foreign keys,
+        comparisons on sorted columns) narrow the candidates, whose key
+        sets are intersected; the remaining conditions are checked on the
+        candidates only.
+        """
+        conditions = query.parse(criteria, cls)
+        self.__require(cls)
+        keys = None
+        for attr, op, value in conditions:
+            index = self.__find_index(cls, attr)
+            found = index.lookup(op, value) if index else None
+            if found is not None:
+                keys = found if keys is None else keys & found
+        if keys is None:
+            keys = self.__keys_of(cls)
+        objs = {}
+        for key in keys:
+            obj = FileStorage.__objects[key]
+            if query.matches(obj, conditions):
+                objs[key] = obj
+        return objs
+
+    @_reads
+    def near(self, latitude, longitude, radius):
+        """Returns the places within radius km of a point, nearest first"""
+        cls = self.__model_classes()['Place']
+        found = {}
+        for box in geo.boxes(latitude, longitude, radius):
+            found.update(self.__within(cls, *box))
+        ranked = []
+        for place in found.values():
+            dist = geo.distance(latitude, longitude,
+                                place.latitude, place.longitude)
+            if dist <= radius:
+                ranked.append((dist, place))
+        ranked.sort(key=lambda item: item[0])
+        return [place for dist, place in ranked]
+
+    @_reads
+    def within(self, min_lat, min_lon, max_lat, max_lon):
+        """Returns the places inside a latitude/longitude bounding box"""
+        cls = self.__model_classes()['Place']
+        return self.__within(cls, min_lat, min_lon, max_lat, max_lon)
+
+    @_reads
+    def search(self, cls, text):
+        """Returns the objects of cls matching any term of text, best
+        match first (see text_index)
+
+        The full-text index is loaded from file.json.fts on first use, or
+        rebuilt if the storage files changed since it was written, then
+        kept current as objects change. It is written back by compact(),
+        close() and at exit, when nothing is left unsaved.
+        """
+        classes = self.__model_classes()
+        names = set(name for name in text_index.FIELDS
+                    if issubclass(classes[name], cls))
+        if not names:
+            return []
+        with _build_lock:
+            keys = self.__text_index().search(text)
+        return [FileStorage.__objects[key] for key in keys
+                if key.partition('.')[0] in names]
+
+    @_writes
     def save(self):
-        """Saves storage dictionary to file"""
-        with open(FileStorage.__file_path, 'w') as f:
-            temp = {}
-            temp.update(FileStorage.__objects)
-            for key, val in temp.items():
-                temp[key] = val.to_dict()
-            json.dump(temp, f)
+        """Saves storage dictionary to file; does nothing if no object
+        changed since the last save
+
+        Only the objects changed since the last save are serialized, the
+        others are written from a per-object JSON cache. In journal mode
+        (HBNB_FILE_JOURNAL=1) their records are appended to a log next to
+        the snapshot instead, until compact() folds it back in; the
+        sharded layout only rewrites the files of the changed classes.
+        """
+        if FileStorage.__journal:
+            self.__append_journal()
+        elif FileStorage.__dirty or FileStorage.__removed or \
+                os.path.exists(self.__journal_path()):
+            self.__write_snapshot(self.__changed_classes())
 
+    @_writes
     def delete(self, obj=None):
         """Deletes obj from __objects if it exists"""
         if obj is not None:
+            self.__require(type(obj))
             key = "{}.{}".format(obj.__class__.__name__, obj.id)
             if key in FileStorage.__objects:
-                del FileStorage.__objects[key]
+                self.__discard(key)
+                self.__forget(key)
+                FileStorage.__dirty.discard(key)
+                FileStorage.__removed.add(key)
                 self.save()
 
+    @_writes
+    def compact(self):
+        """Folds the journal into a fresh snapshot"""
+        self.__write_snapshot()
+        self.__save_text()
+
+    def close(self):
+        """Ends a unit of work by reloading the objects from disk"""
+        self.__flush_text()
+        self.reload()
+
+    @_writes
     def reload(self):
-        """Loads storage dictionary from file"""
-        from models.base_model import BaseModel
-        from models.user import User
-        from models.place import Place
-        from models.state import State
-        from models.city import City
-        from models.amenity import Amenity
-        from models.review import Review
-
-        classes = {
-                    'BaseModel': BaseModel, 'User': User, 'Place': Place,
-                    'State': State, 'City': City, 'Amenity': Amenity,
-                    'Review': Review
-                  }
+        """Loads storage dictionary from file
+
+        The snapshot is decoded record by record, never parsed whole. In
+        lazy mode (HBNB_FILE_LAZY=1) the records are kept and an object is
+        built the first time it is accessed; HBNB_FILE_COMPACT=1 packs
+        those records into per-class column tuples. With
+        HBNB_FILE_LAYOUT=sharded (one file.<Class>.json per class) a shard
+        is only read once its class is needed; HBNB_FILE_WORKERS > 1
+        decodes several large shards in worker processes (off by default,
+        see benchmarks/shard_reload.py). With HBNB_FILE_LAYOUT=binary the
+        file.bin snapshot is read through mmap (see binary_format).
+        """
+        classes = self.__model_classes()
+        if FileStorage.__layout == 'sharded':
+            FileStorage.__unloaded = set(
+                name for name in classes
+                if os.path.exists(self.__shard_path(name)))
+            self.__count_journal()
+            return
+        if FileStorage.__layout == 'binary':
+            self.__load_binary(classes)
+            self.__replay_journal(classes)
+            return
         try:
-            temp = {}
             if os.path.getsize(FileStorage.__file_path) > 0:
                 with open(FileStorage.__file_path, 'r') as f:
-                    temp = json.load(f)
-                    for key, val in temp.items():
-                        self.all()[key] = classes[val['__class__']](**val)
+                    for key, val in _RecordStream(f):
+                        self.__load(key, self.__build(classes, val))
         except FileNotFoundError:
             pass
         except json.JSONDecodeError:
             pass
+        self.__replay_journal(classes)
+
+    def __model_classes(self):
+        """Returns the model classes by name"""
+        if not FileStorage.__models:
+            from models.base_model import BaseModel
+            from models.user import User
+            from models.place import Place
+            from models.state import State
+            from models.city import City
+            from models.amenity import Amenity
+            from models.review import Review
+
+            FileStorage.__models.update({
+                'BaseModel': BaseModel, 'User': User, 'Place': Place,
+                'State': State, 'City': City, 'Amenity': Amenity,
+                'Review': Review
+            })
+        return FileStorage.__models
+
+    def __binary_path(self):
+        """Returns the path of the binary snapshot"""
+        return os.path.splitext(FileStorage.__file_path)[0] + '.bin'
+
+    def __load_binary(self, classes):
+        """Loads the index of the binary snapshot and its records
+
+        In lazy mode the records keep the file mapped; otherwise it is
+        unmapped once every record is decoded.
+        """
+        try:
+            view, index = binary_format.load(self.__binary_path())
+        except (FileNotFoundError, ValueError):
+            return
+        for key, (offset, length) in index.items():
+            cls = classes[key.partition('.')[0]]
+            if FileStorage.__lazy:
+                obj = _MappedRecord(cls, view, offset, length)
+            else:
+                obj = cls(**binary_format.decode(view, offset, length))
+            self.__load(key, obj)
+        if not FileStorage.__lazy:
+            view.close()
+
+    def __shard_path(self, name):
+        """Returns the path of the shard holding the objects of a class"""
+        root, ext = os.path.splitext(FileStorage.__file_path)
+        return '{}.{}{}'.format(root, name, ext)
+
+    def __require(self, cls=None):
+        """Reads the unloaded shards of cls (or of every class)"""
+        if not FileStorage.__unloaded:
+            return
+        with _build_lock:
+            self.__read_shards(cls)
+
+    def __read_shards(self, cls):
+        """Reads the unloaded shards of cls, holding the build lock"""
+        classes = self.__model_classes()
+        names = sorted(name for name in FileStorage.__unloaded
+                       if cls is None or issubclass(classes[name], cls))
+        if not names:
+            return
+        FileStorage.__unloaded.difference_update(names)
+        paths = [self.__shard_path(name) for name in names]
+        size = sum(os.path.getsize(path) for path in paths
+                   if os.path.exists(path))
+        if len(paths) > 1 and FileStorage.__workers > 1 and \
+                size >= FileStorage.__parallel_min_bytes:
+            with ProcessPoolExecutor(min(len(paths),
+                                         FileStorage.__workers)) as pool:
+                shards = pool.map(_read_shard, paths)
+                for pairs in shards:
+                    for key, val in pairs:
+                        self.__load(key, self.__build(classes, val))
+        else:
+            for path in paths:
+                try:
+                    with open(path, 'r') as f:
+                        for key, val in _RecordStream(f):
+                            self.__load(key, self.__build(classes, val))
+                except (FileNotFoundError, json.JSONDecodeError):
+                    pass
+        self.__replay_journal(classes, names)
+
+    def __build(self, classes, record):
+        """Returns the object for a record read from disk
+
+        In lazy mode the record itself is kept until first access.
+        """
+        cls = classes[record['__class__']]
+        if FileStorage.__lazy:
+            if FileStorage.__compact:
+                table = FileStorage.__tables.setdefault(cls, _RecordTable())
+                return _CompactRecord(cls, table, record)
+            return _DictRecord(cls, record)
+        return cls(**record)
+
+    def __add(self, key, obj):
+        """Stores obj under key and files it in its class bucket"""
+        cls = obj.cls if isinstance(obj, _Record) else type(obj)
+        dict.__setitem__(FileStorage.__objects, key, obj)
+        FileStorage.__classes.setdefault(cls, set()).add(key)
+        self.__index(key, obj)
+        self.__mark_text(key)
+
+    def __discard(self, key):
+        """Removes the object stored under key from every index"""
+        obj = dict.pop(FileStorage.__objects, key, None)
+        if obj is not None:
+            cls = obj.cls if isinstance(obj, _Record) else type(obj)
+            FileStorage.__classes[cls].discard(key)
+            self.__unindex(key)
+            self.__mark_text(key)
+
+    def __fields(self, obj):
+        """Returns the attributes of a stored object or record"""
+        if isinstance(obj, _Record):
+            return obj.record
+        return obj.__dict__
+
+    def __keys_of(self, cls):
+        """Returns the keys of the objects of cls, read from a snapshot of
+        the class buckets as another reader may be loading a shard"""
+        return [key for bucket_cls, bucket
+                in list(FileStorage.__classes.items())
+                if issubclass(bucket_cls, cls) for key in bucket]
+
+    def __sorted_keys(self, cls):
+        """Returns the sorted keys of the objects of cls (or of all)"""
+        with _lock.read():
+            self.__require(cls)
+            if cls is None:
+                return sorted(FileStorage.__objects)
+            return sorted(self.__keys_of(cls))
+
+    def __within(self, cls, min_lat, min_lon, max_lat, max_lon):
+        """Returns the objects of cls inside a bounding box"""
+        self.__require(cls)
+        index = self.__find_index(cls, ('latitude', 'longitude'))
+        objs = {}
+        for key in index.box(min_lat, min_lon, max_lat, max_lon):
+            obj = FileStorage.__objects[key]
+            if min_lat <= obj.latitude <= max_lat and \
+                    min_lon <= obj.longitude <= max_lon:
+                objs[key] = obj
+        return objs
+
+    def __pick(self, fields, attr):
+        """Returns the value(s) of attr, a name or a tuple of names"""
+        if isinstance(attr, tuple):
+            return tuple(fields.get(name) for name in attr)
+        return fields.get(attr)
+
+    def __find_index(self, cls, attr):
+        """Returns the index of attr for cls, building it on first use
+
+        Returns None if the column of attr is neither a foreign key nor
+        declared with index=True.
+        """
+        index = FileStorage.__indexes.get((cls, attr))
+        if index is not None:
+            return index
+        with _build_lock:
+            return self.__build_index(cls, attr)
+
+    def __build_index(self, cls, attr):
+        """Builds and publishes the index of attr, holding the build lock"""
+        index = FileStorage.__indexes.get((cls, attr))
+        if index is not None:
+            return index
+        table = getattr(cls, '__table__', None)
+        if table is None:
+            return None
+        if isinstance(attr, tuple):
+            if not all(name in table.columns for name in attr):
+                return None
+            index = _GridIndex()
+        elif attr not in table.columns:
+            return None
+        elif table.columns[attr].foreign_keys:
+            index = _HashIndex()
+        elif table.columns[attr].index:
+            index = _SortedIndex()
+        else:
+            return None
+        for key in FileStorage.__classes.get(cls, ()):
+            obj = dict.__getitem__(FileStorage.__objects, key)
+            value = self.__pick(self.__fields(obj), attr)
+            index.add(value, key)
+            FileStorage.__indexed.setdefault(key, (cls, {}))[1][attr] = value
+        FileStorage.__indexes[(cls, attr)] = index
+        return index
+
+    def __index(self, key, obj):
+        """Files obj in the indexes built for its class"""
+        cls = obj.cls if isinstance(obj, _Record) else type(obj)
+        attrs = [attr for index_cls, attr in FileStorage.__indexes
+                 if index_cls is cls]
+        if not attrs:
+            return
+        fields = self.__fields(obj)
+        values = {attr: self.__pick(fields, attr) for attr in attrs}
+        if FileStorage.__indexed.get(key) == (cls, values):
+            return
+        self.__unindex(key)
+        for attr, value in values.items():
+            FileStorage.__indexes[(cls, attr)].add(value, key)
+        FileStorage.__indexed[key] = (cls, values)
+
+    def __index_many(self, objs):
+        """Files new objects (by key) in the indexes built for them"""
+        by_class = {}
+        for key, obj in objs.items():
+            by_class.setdefault(type(obj), []).append(key)
+        for cls, keys in by_class.items():
+            attrs = [attr for index_cls, attr in FileStorage.__indexes
+                     if index_cls is cls]
+            if not attrs:
+                continue
+            values = {key: {attr: self.__pick(objs[key].__dict__, attr)
+                            for attr in attrs} for key in keys}
+            for attr in attrs:
+                FileStorage.__indexes[(cls, attr)].add_many(
+                    (values[key][attr], key) for key in keys)
+            for key in keys:
+                FileStorage.__indexed[key] = (cls, values[key])
+
+    def __unindex(self, key):
+        """Drops key from the indexes it was filed in"""
+        cls, values = FileStorage.__indexed.pop(key, (None, {}))
+        for attr, value in values.items():
+            FileStorage.__indexes[(cls, attr)].remove(value, key)
+
+    def __text_path(self):
+        """Returns the path of the full-text index kept beside the data"""
+        return FileStorage.__file_path + '.fts'
+
+    def __signature(self):
+        """Returns the path, size and mtime of every storage file"""
+        paths = [FileStorage.__file_path, self.__journal_path(),
+                 self.__binary_path()]
+        paths += [self.__shard_path(name)
+                  for name in sorted(self.__model_classes())]
+        signature = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            signature.append([path, stat.st_size, stat.st_mtime_ns])
+        return signature
+
+    def __text_index(self):
+        """Returns the full-text index, loading or building it on first use
+
+        The saved index is only used if the storage files are the ones it
+        was written for; unsaved changes are applied on top of it.
+        """
+        classes = self.__model_classes()
+        if FileStorage.__text is None:
+            for name in text_index.FIELDS:
+                self.__require(classes[name])
+            index = text_index.TextIndex.load(self.__text_path(),
+                                              self.__signature())
+            if index is None:
+                index = text_index.TextIndex()
+                for name, attrs in text_index.FIELDS.items():
+                    for key in FileStorage.__classes.get(classes[name], ()):
+                        obj = dict.__getitem__(FileStorage.__objects, key)
+                        index.add(key, text_index.document(
+                            self.__fields(obj), attrs))
+                FileStorage.__retext = set()
+            else:
+                FileStorage.__retext = FileStorage.__dirty | \
+                    FileStorage.__removed
+            FileStorage.__text = index
+            if not FileStorage.__text_at_exit:
+                FileStorage.__text_at_exit = True
+                atexit.register(self.__flush_text)
+        self.__sync_text()
+        return FileStorage.__text
+
+    def __mark_text(self, key):
+        """Queues key for the full-text index if it is in use"""
+        if FileStorage.__text is not None and \
+                key.partition('.')[0] in text_index.FIELDS:
+            FileStorage.__retext.add(key)
+
+    def __sync_text(self):
+        """Applies the queued changes to the full-text index"""
+        for key in FileStorage.__retext:
+            name = key.partition('.')[0]
+            if name not in text_index.FIELDS:
+                continue
+            obj = dict.get(FileStorage.__objects, key)
+            if obj is None:
+                FileStorage.__text.remove(key)
+            else:
+                FileStorage.__text.add(key, text_index.document(
+                    self.__fields(obj), text_index.FIELDS[name]))
+        FileStorage.__retext.clear()
+
+    def __save_text(self):
+        """Writes the full-text index, if in use, beside the storage files
+
+        It is skipped while changes are unsaved: the index is tagged with
+        the signature of the files and must describe their content.
+        """
+        if FileStorage.__text is not None and not FileStorage.__dirty \
+                and not FileStorage.__removed:
+            self.__sync_text()
+            FileStorage.__text.dump(self.__text_path(), self.__signature())
+
+    def __flush_text(self):
+        """Writes the full-text index under the write lock"""
+        with _lock.write():
+            self.__save_text()
+
+    def __load(self, key, obj):
+        """Stores an object read from disk, or drops it if obj is None"""
+        if obj is None:
+            self.__discard(key)
+        else:
+            self.__add(key, obj)
+        self.__forget(key)
+        FileStorage.__dirty.discard(key)
+        FileStorage.__removed.discard(key)
+
+    def __journal_path(self):
+        """Returns the path of the journal kept beside the snapshot"""
+        return FileStorage.__file_path + '.log'
+
+    def __forget(self, key):
+        """Drops the cached serialized forms of an object"""
+        FileStorage.__cache.pop(key, None)
+        FileStorage.__blobs.pop(key, None)
+
+    def __serialize(self, key):
+        """Returns the cached JSON text of an object, refreshing if dirty"""
+        cache = FileStorage.__cache
+        if key in FileStorage.__dirty or key not in cache:
+            obj = dict.__getitem__(FileStorage.__objects, key)
+            if isinstance(obj, _Record):
+                cache[key] = json.dumps(obj.record)
+            else:
+                cache[key] = json.dumps(obj.to_dict())
+        return cache[key]
+
+    def __encode(self, key):
+        """Returns the binary record of an object, refreshing if dirty"""
+        blobs = FileStorage.__blobs
+        if key in FileStorage.__dirty or key not in blobs:
+            obj = dict.__getitem__(FileStorage.__objects, key)
+            if isinstance(obj, _MappedRecord):
+                return obj.blob()
+            if isinstance(obj, _Record):
+                blobs[key] = binary_format.encode(obj.record)
+            else:
+                blobs[key] = binary_format.encode(obj.to_dict())
+        return blobs[key]
+
+    def __changed_classes(self):
+        """Returns the names of the classes changed since the last save"""
+        return set(key.partition('.')[0]
+                   for key in FileStorage.__dirty | FileStorage.__removed)
+
+    def __write_json(self, path, keys):
+        """Atomically writes the objects under keys to a JSON file"""
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            sep = '{'
+            for key in keys:
+                f.write(sep + json.dumps(key) + ': ' + self.__serialize(key))
+                sep = ', '
+            f.write('{}' if sep == '{' else '}')
+        os.replace(tmp_path, path)
+
+    def __write_snapshot(self, names=None):
+        """Atomically rewrites the snapshot and drops the journal
+
+        In the sharded layout only the shards of the named classes are
+        rewritten, or every shard when names is None.
+        """
+        if names is None or os.path.exists(self.__journal_path()):
+            self.__require()
+            names = set(self.__model_classes())
+        if FileStorage.__layout == 'sharded':
+            classes = self.__model_classes()
+            for name in names:
+                keys = FileStorage.__classes.get(classes[name])
+                if keys:
+                    self.__write_json(self.__shard_path(name), keys)
+                elif os.path.exists(self.__shard_path(name)):
+                    os.remove(self.__shard_path(name))
+        elif FileStorage.__layout == 'binary':
+            binary_format.write(self.__binary_path(),
+                                ((key, self.__encode(key))
+                                 for key in FileStorage.__objects))
+        else:
+            self.__write_json(FileStorage.__file_path, FileStorage.__objects)
+        try:
+            os.remove(self.__journal_path())
+        except FileNotFoundError:
+            pass
+        FileStorage.__journal_size = 0
+        FileStorage.__dirty.clear()
+        FileStorage.__removed.clear()
+
+    def __append_journal(self):
+        """Appends a record for every object changed since the last save"""
+        lines = []
+        for key in FileStorage.__dirty:
+            if key in FileStorage.__objects:
+                lines.append('["put",' + json.dumps(key) + ',' +
+                             self.__serialize(key) + ']')
+        for key in FileStorage.__removed:
+            lines.append('["del",' + json.dumps(key) + ']')
+        FileStorage.__dirty.clear()
+        FileStorage.__removed.clear()
+        if not lines:
+            return
+        with open(self.__journal_path(), 'a') as f:
+            f.write('\n'.join(lines) + '\n')
+        FileStorage.__journal_size += len(lines)
+        if FileStorage.__journal_size >= FileStorage.__compact_threshold:
+            self.compact()
+
+    def __count_journal(self):
+        """Sets the journal size from the records already on disk"""
+        FileStorage.__journal_size = len(self.__scan_journal())
+
+    def __scan_journal(self):
+        """Returns the records of the journal
+
+        A torn final record left by an interrupted append is cut off the
+        file, so that the next append starts on a line of its own.
+        """
+        records = []
+        try:
+            with open(self.__journal_path(), 'rb+') as f:
+                end = 0
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break
+                    if not line.endswith(b'\n'):
+                        f.write(b'\n')
+                        line += b'\n'
+                    records.append(record)
+                    end += len(line)
+                f.truncate(end)
+        except FileNotFoundError:
+            pass
+        return records
+
+    def __replay_journal(self, classes, names=None):
+        """Applies the journal records on top of the loaded snapshot
+
+        Only the records of the named classes are applied if names is
+        given.
+        """
+        records = self.__scan_journal()
+        for record in records:
+            if names is not None and \
+                    record[1].partition('.')[0] not in names:
+                continue
+            if record[0] == 'put':
+                self.__load(record[1], self.__build(classes, record[2]))
+            else:
+                self.__load(record[1], None)
+        FileStorage.__journal_size = len(records)
@@ -0,0 +1,38 @@
+#!/usr/bin/python3
+"""This module holds the distance helpers used by storage.near()"""
+from math import asin, cos, degrees, radians, sin, sqrt
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def distance(lat1, lon1, lat2, lon2):
+    """Returns the great-circle distance between two points in km"""
+    dlat = radians(lat2 - lat1)
+    dlon = radians(lon2 - lon1)
+    a = sin(dlat / 2) ** 2 + \
+        cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * asin(min(1.0, sqrt(a)))
+
+
+def boxes(latitude, longitude, radius):
+    """Returns the bounding boxes covering a circle of radius km
+
+    Each box is (min_lat, min_lon, max_lat, max_lon). A circle crossing
+    the antimeridian is covered by two boxes, one reaching a pole by a
+    box spanning every longitude.
+    """
+    angle = radius / EARTH_RADIUS_KM
+    min_lat = latitude - degrees(angle)
+    max_lat = latitude + degrees(angle)
+    if min_lat <= -90 or max_lat >= 90:
+        return [(max(min_lat, -90.0), -180.0, min(max_lat, 90.0), 180.0)]
+    dlon = degrees(asin(sin(angle) / cos(radians(latitude))))
+    min_lon = longitude - dlon
+    max_lon = longitude + dlon
+    if min_lon < -180:
+        return [(min_lat, min_lon + 360, max_lat, 180.0),
+                (min_lat, -180.0, max_lat, max_lon)]
+    if max_lon > 180:
+        return [(min_lat, min_lon, max_lat, 180.0),
+                (min_lat, -180.0, max_lat, max_lon - 360)]
+    return [(min_lat, min_lon, max_lat, max_lon)]
@@ -0,0 +1,60 @@
+#!/usr/bin/python3
+"""This module parses the criteria accepted by storage.filter()
+
+A criterion is written as <attribute>=<value> for equality or
+<attribute>__<op>=<value> where op is one of ne, lt, lte, gt, gte or in,
+e.g. storage.filter(Place, city_id=some_id, max_guest__gte=4). Every
+attribute must be a column of the model filtered, on every engine.
+"""
+import operator
+from sqlalchemy import Column
+
+OPERATORS = {
+    'eq': operator.eq, 'ne': operator.ne,
+    'lt': operator.lt, 'lte': operator.le,
+    'gt': operator.gt, 'gte': operator.ge,
+    'in': lambda value, values: value in values
+}
+
+
+def columns(cls):
+    """Returns the names of the columns of a model class"""
+    table = getattr(cls, '__table__', None)
+    if table is not None:
+        return set(table.columns.keys())
+    # BaseModel itself is not mapped; its columns are plain attributes
+    return {name for name in dir(cls)
+            if isinstance(getattr(cls, name), Column)}
+
+
+def parse(criteria, cls=None):
+    """Returns the (attribute, op, value) conditions of criteria
+
+    Raises ValueError for an unknown operator, or for an attribute that
+    is not a column of cls when cls is given.
+    """
+    names = columns(cls) if cls is not None else None
+    conditions = []
+    for name, value in criteria.items():
+        attr, _, op = name.partition('__')
+        op = op or 'eq'
+        if op not in OPERATORS:
+            raise ValueError('unknown operator {!r} in {!r}'.format(op, name))
+        if names is not None and attr not in names:
+            raise ValueError('unknown attribute {!r} of {}'.format(
+                attr, cls.__name__))
+        if op == 'in':
+            value = list(value)
+        conditions.append((attr, op, value))
+    return conditions
+
+
+def matches(obj, conditions):
+    """Tells whether obj satisfies every condition"""
+    for attr, op, value in conditions:
+        try:
+            if not OPERATORS[op](getattr(obj, attr, None), value):
+                return False
+        except TypeError:
+            return False
+    return True
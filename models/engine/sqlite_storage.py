@@ -0,0 +1,65 @@
+#!/usr/bin/python3
+"""Defines the SQLiteStorage engine
+
+DBStorage on a local SQLite file, for setups without a MySQL server.
+Every connection is tuned for throughput when it is opened:
+    HBNB_SQLITE_PATH          database file (hbnb.db)
+    HBNB_SQLITE_JOURNAL       journal mode (WAL: readers never block the
+                              writer and a commit appends to the log)
+    HBNB_SQLITE_SYNCHRONOUS   fsync level (NORMAL: with WAL a power loss
+                              may drop the last commits, never corrupt)
+    HBNB_SQLITE_CACHE_SIZE    page cache in KiB per connection (65536)
+    HBNB_SQLITE_COMMIT_EVERY  save() calls per commit (1)
+    HBNB_SQLITE_FOREIGN_KEYS  1 to enforce foreign keys like MySQL (1)
+"""
+from os import getenv
+from sqlalchemy import create_engine, event
+from models.engine.db_storage import DBStorage, pool_options
+
+
+def pragmas():
+    """Returns the PRAGMA statements run on every new connection"""
+    return [
+        "PRAGMA journal_mode={}".format(getenv("HBNB_SQLITE_JOURNAL", "WAL")),
+        "PRAGMA synchronous={}".format(
+            getenv("HBNB_SQLITE_SYNCHRONOUS", "NORMAL")),
+        "PRAGMA cache_size=-{}".format(
+            int(getenv("HBNB_SQLITE_CACHE_SIZE", "65536"))),
+        "PRAGMA foreign_keys={}".format(
+            int(getenv("HBNB_SQLITE_FOREIGN_KEYS", "1")))
+    ]
+
+
+class SQLiteStorage(DBStorage):
+    """DBStorage on a SQLite database file"""
+
+    def __init__(self, path=None):
+        """Instantiates a new SQLiteStorage object on path, by default
+        HBNB_SQLITE_PATH"""
+        path = path or getenv("HBNB_SQLITE_PATH", "hbnb.db")
+        engine = create_engine(f"sqlite:///{path}", **pool_options())
+        event.listen(engine, "connect", self.__tune)
+        event.listen(engine, "begin", self.__begin)
+        super().__init__(engine, int(getenv("HBNB_SQLITE_COMMIT_EVERY",
+                                            "1")))
+
+    def __tune(self, dbapi_connection, connection_record):
+        """Applies the pragmas to a connection the pool just opened and
+        leaves transactions to __begin()"""
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas():
+            cursor.execute(pragma)
+        cursor.close()
+        dbapi_connection.isolation_level = None
+
+    def __begin(self, connection):
+        """Starts the transaction SQLAlchemy begins
+
+        sqlite3 would only send BEGIN before the first write, so a
+        SAVEPOINT opened first (see bulk_create()) would start, and its
+        RELEASE commit, a transaction of its own. BEGIN goes to the
+        driver directly so it is not counted as a query.
+        """
+        cursor = connection.connection.cursor()
+        cursor.execute("BEGIN")
+        cursor.close()
@@ -0,0 +1,109 @@
+#!/usr/bin/python3
+"""This module defines the full-text index used by storage.search()
+
+Text is split into lowercase word tokens; each term keeps a posting list
+mapping the keys of the documents containing it to its number of
+occurrences there. Results are ranked with BM25.
+"""
+import json
+import os
+import re
+from collections import Counter
+from math import log
+
+FIELDS = {'Place': ('name', 'description'), 'Review': ('text',)}
+TOKEN = re.compile(r'\w+')
+K1 = 1.2
+B = 0.75
+
+
+def tokenize(text):
+    """Returns the lowercase word tokens of text"""
+    return TOKEN.findall(text.lower())
+
+
+def document(fields, attrs):
+    """Returns the searchable text of a record from its attrs"""
+    return ' '.join(str(fields.get(attr) or '') for attr in attrs)
+
+
+class TextIndex:
+    """An inverted index from terms to the documents containing them"""
+
+    def __init__(self):
+        """Starts empty"""
+        self.postings = {}
+        self.docs = {}
+        self.sizes = {}
+        self.length = 0
+
+    def add(self, key, text):
+        """Indexes text as the document stored under key"""
+        self.remove(key)
+        terms = Counter(tokenize(text))
+        if not terms:
+            return
+        self.docs[key] = dict(terms)
+        self.sizes[key] = sum(terms.values())
+        self.length += self.sizes[key]
+        for term, count in terms.items():
+            self.postings.setdefault(term, {})[key] = count
+
+    def remove(self, key):
+        """Drops the document stored under key"""
+        terms = self.docs.pop(key, None)
+        if terms is None:
+            return
+        self.length -= self.sizes.pop(key)
+        for term in terms:
+            posting = self.postings[term]
+            del posting[key]
+            if not posting:
+                del self.postings[term]
+
+    def search(self, text):
+        """Returns the keys of the documents matching any term of text,
+        best match first"""
+        if not self.docs:
+            return []
+        average = self.length / len(self.docs)
+        scores = Counter()
+        for term in set(tokenize(text)):
+            posting = self.postings.get(term, {})
+            if not posting:
+                continue
+            idf = log(1 + (len(self.docs) - len(posting) + 0.5) /
+                      (len(posting) + 0.5))
+            for key, count in posting.items():
+                size = self.sizes[key]
+                scores[key] += idf * count * (K1 + 1) / \
+                    (count + K1 * (1 - B + B * size / average))
+        return [key for key, score in
+                sorted(scores.items(), key=lambda item: (-item[1], item[0]))]
+
+    def dump(self, path, signature):
+        """Atomically writes the index to path, tagged with signature"""
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'signature': signature, 'docs': self.docs}, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, signature):
+        """Returns the index stored at path, or None if it is missing,
+        unreadable or was written for another signature"""
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if data.get('signature') != signature:
+            return None
+        index = cls()
+        for key, terms in data['docs'].items():
+            index.docs[key] = terms
+            index.sizes[key] = sum(terms.values())
+            index.length += index.sizes[key]
+            for term, count in terms.items():
+                index.postings.setdefault(term, {})[key] = count
+        return index
@@ -1,21 +1,38 @@
 #!/usr/bin/python3
 """ Place Module for HBNB project """
-from sqlalchemy import Column, String, Integer, ForeignKey, Float
+from sqlalchemy import Column, String, Integer, ForeignKey, Float, Index
 from sqlalchemy.orm import relationship
 from models.base_model import BaseModel, Base
+import models
+from models.review import Review
 
 
 class Place(BaseModel, Base):
     """ A place to stay """
     __tablename__ = 'places'
-    city_id = Column(String(60), ForeignKey('cities.id'), nullable=False)
-    user_id = Column(String(60), ForeignKey('users.id'), nullable=False)
+    __table_args__ = (Index('ix_places_location', 'latitude', 'longitude'),)
+    city_id = Column(String(60), ForeignKey('cities.id'), nullable=False,
+                     index=True)
+    user_id = Column(String(60), ForeignKey('users.id'), nullable=False,
+                     index=True)
     name = Column(String(128), nullable=False)
     description = Column(String(1024), nullable=True)
-    number_rooms = Column(Integer, default=0, nullable=False)
-    number_bathrooms = Column(Integer, default=0, nullable=False)
-    max_guest = Column(Integer, default=0, nullable=False)
-    price_by_night = Column(Integer, default=0, nullable=False)
+    number_rooms = Column(Integer, default=0, nullable=False,
+                          index=True)
+    number_bathrooms = Column(Integer, default=0, nullable=False,
+                              index=True)
+    max_guest = Column(Integer, default=0, nullable=False,
+                       index=True)
+    price_by_night = Column(Integer, default=0, nullable=False,
+                            index=True)
     latitude = Column(Float, nullable=True)
     longitude = Column(Float, nullable=True)
-    reviews = relationship("Review", backref="place", cascade="all, delete")
+
+    if models.storage_type in models.db_types:
+        reviews = relationship(
+            "Review", backref="place", cascade="all, delete")
+    else:
+        @property
+        def reviews(self):
+            """ Getter for reviews """
+            return models.storage.related(Review, 'place_id', self.id)
@@ -8,5 +8,7 @@ class Review(BaseModel, Base):
     """Review class to store user reviews"""
     __tablename__ = 'reviews'
     text = Column(String(1024), nullable=False)
-    place_id = Column(String(60), ForeignKey('places.id'), nullable=False)
-    user_id = Column(String(60), ForeignKey('users.id'), nullable=False)
+    place_id = Column(String(60), ForeignKey('places.id'), nullable=False,
+                      index=True)
+    user_id = Column(String(60), ForeignKey('users.id'), nullable=False,
+                     index=True)
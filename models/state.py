@@ -12,14 +12,12 @@ class State(BaseModel, Base):
     __tablename__ = 'states'
     name = Column(String(128), nullable=False)
 
-    if models.storage_type == "db":
+    if models.storage_type in models.db_types:
         cities = relationship(
-            "City", backref="state", cascade="all, delete, delete-orphan")
+            "City", backref="state", cascade="all, delete, delete-orphan",
+            lazy="selectin")
     else:
         @property
         def cities(self):
             """ Getter for cities """
-            return [
-                city for city in models.storage.all(City).values()
-                if city.state_id == self.id
-                ]
+            return models.storage.related(City, 'state_id', self.id)
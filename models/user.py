@@ -3,6 +3,9 @@
 from sqlalchemy import Column, String
 from sqlalchemy.orm import relationship
 from models.base_model import BaseModel, Base
+import models
+from models.place import Place
+from models.review import Review
 
 
 class User(BaseModel, Base):
@@ -12,5 +15,18 @@ class User(BaseModel, Base):
     password = Column(String(128), nullable=False)
     first_name = Column(String(128), nullable=True)
     last_name = Column(String(128), nullable=True)
-    places = relationship("Place", backref="user", cascade="all, delete")
-    reviews = relationship("Review", backref="user", cascade="all, delete")
+
+    if models.storage_type in models.db_types:
+        places = relationship("Place", backref="user", cascade="all, delete")
+        reviews = relationship(
+            "Review", backref="user", cascade="all, delete")
+    else:
+        @property
+        def places(self):
+            """Getter for places"""
+            return models.storage.related(Place, 'user_id', self.id)
+
+        @property
+        def reviews(self):
+            """Getter for reviews"""
+            return models.storage.related(Review, 'user_id', self.id)
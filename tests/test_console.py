@@ -1,5 +1,10 @@
 #!/usr/bin/python3
 
+import gzip
+import json
+import os
+import shutil
+import tempfile
 import unittest
 from unittest.mock import patch
 from io import StringIO
@@ -38,6 +43,29 @@ class TestHBNBCommand(unittest.TestCase):
             output = f.getvalue().strip()
         self.assertIn(user_id, output)
 
+    def test_all_limit_after(self):
+        """Test all command paging with --limit and --after"""
+        ids = []
+        for n in range(3):
+            with patch('sys.stdout', new=StringIO()) as f:
+                self.console.onecmd("create Amenity")
+                ids.append(f.getvalue().strip())
+        with patch('sys.stdout', new=StringIO()) as f:
+            self.console.onecmd("all Amenity")
+            listed = eval(f.getvalue())
+        first = listed[0].split()[1][1:-1]
+
+        with patch('sys.stdout', new=StringIO()) as f:
+            self.console.onecmd("all Amenity --limit 1")
+            self.assertEqual(eval(f.getvalue()), listed[:1])
+        with patch('sys.stdout', new=StringIO()) as f:
+            self.console.onecmd(f"all Amenity --after {first} --limit 2")
+            self.assertEqual(eval(f.getvalue()), listed[1:3])
+        with patch('sys.stdout', new=StringIO()) as f:
+            self.console.onecmd("all Amenity --limit x")
+            output = f.getvalue().strip()
+        self.assertEqual(output, "** invalid limit: x **")
+
     def test_all_invalid_class(self):
         """Test all command with invalid class name"""
         with patch('sys.stdout', new=StringIO()) as f:
@@ -155,10 +183,13 @@ class TestHBNBCommand(unittest.TestCase):
             self.console.onecmd("create User")
             user_id = f.getvalue().strip()
 
-        with patch('sys.stdout', new=StringIO()) as f:
+        with patch('sys.stdout', new=StringIO()) as f, \
+                patch.object(type(storage), 'save', autospec=True,
+                             side_effect=type(storage).save) as save:
             self.console.onecmd(f"destroy User {user_id}")
             output = f.getvalue().strip()
         self.assertEqual(output, "")
+        self.assertEqual(save.call_count, 1)
 
         # Try to show the destroyed instance
         with patch('sys.stdout', new=StringIO()) as f:
@@ -310,6 +341,198 @@ class TestHBNBCommand(unittest.TestCase):
             output = f.getvalue().strip()
         self.assertEqual(output, "** value missing **")
 
+    def test_where(self):
+        """Test where command with plain and dot syntax"""
+        with patch('sys.stdout', new=StringIO()) as f:
+            self.console.onecmd('create Place city_id="c-where" '
+                                'name="Big_house" max_guest=6')
+            big_id = f.getvalue().strip()
+        with patch('sys.stdout', new=StringIO()) as f:
+            self.console.onecmd('create Place city_id="c-where" max_guest=2')
+            small_id = f.getvalue().strip()
+
+        with patch('sys.stdout', new=StringIO()) as f:
+            self.console.onecmd('where Place city_id="c-where" max_guest>=4')
+            output = f.getvalue().strip()
+        self.assertIn(big_id, output)
+        self.assertNotIn(small_id, output)
+
+        line = self.console.precmd(
+            'Place.where(name="Big_house", max_guest<4)')
+        with patch('sys.stdout', new=StringIO()) as f:
+            self.console.onecmd(line)
+            output = f.getvalue().strip()
+        self.assertEqual(output, "[]")
+
+    def test_where_invalid_condition(self):
+        """Test where command with a malformed condition"""
+        with patch('sys.stdout', new=StringIO()) as f:
+            self.console.onecmd("where Place max_guest")
+            output = f.getvalue().strip()
+        self.assertEqual(output, "** invalid condition: max_guest **")
+
+        with patch('sys.stdout', new=StringIO()) as f:
+            self.console.onecmd("where Place nope=1")
+            output = f.getvalue().strip()
+        self.assertEqual(output, "** unknown attribute 'nope' of Place **")
+
+    def test_search(self):
+        """Test search command with plain and dot syntax"""
+        with patch('sys.stdout', new=StringIO()) as f:
+            self.console.onecmd('create Place name="Quokka_cabin" '
+                                'description="quokka_quokka_cabin"')
+            cabin_id = f.getvalue().strip()
+        with patch('sys.stdout', new=StringIO()) as f:
+            self.console.onecmd('create Place name="Quokka_view"')
+            view_id = f.getvalue().strip()
+
+        with patch('sys.stdout', new=StringIO()) as f:
+            self.console.onecmd('search Place quokka')
+            output = f.getvalue().strip()
+        self.assertLess(output.index(cabin_id), output.index(view_id))
+
+        line = self.console.precmd('Place.search("cabin")')
+        with patch('sys.stdout', new=StringIO()) as f:
+            self.console.onecmd(line)
+            output = f.getvalue().strip()
+        self.assertIn(cabin_id, output)
+        self.assertNotIn(view_id, output)
+
+    def test_import(self):
+        """Test import command from CSV and JSON Lines files"""
+        from models.city import City
+        from models.place import Place
+        with patch('sys.stdout', new=StringIO()) as f:
+            self.console.onecmd('create State name="Imported"')
+            state_id = f.getvalue().strip()
+        with patch('sys.stdout', new=StringIO()) as f:
+            self.console.onecmd('create User email="a@b.c" password="pw"')
+            user_id = f.getvalue().strip()
+        folder = tempfile.mkdtemp()
+        csv_path = os.path.join(folder, 'cities.csv')
+        with open(csv_path, 'w') as f:
+            f.write('name,state_id\n')
+            f.write('Springfield,{}\nNowhere,missing\n'.format(state_id))
+            f.write('Shelbyville,{}\n'.format(state_id))
+
+        with patch('sys.stdout', new=StringIO()) as f:
+            self.console.onecmd('import City ' + csv_path)
+            output = f.getvalue()
+        self.assertIn("** row 2: unknown state_id missing **", output)
+        self.assertIn("2 rows imported, 1 skipped", output)
+        cities = storage.filter(City, state_id=state_id)
+        self.assertEqual(sorted(c.name for c in cities.values()),
+                         ["Shelbyville", "Springfield"])
+
+        city_id = next(iter(cities.values())).id
+        jsonl_path = os.path.join(folder, 'places.jsonl')
+        with open(jsonl_path, 'w') as f:
+            for guests in ("4", 6):
+                f.write(json.dumps({"city_id": city_id, "user_id": user_id,
+                                    "name": "Loft", "max_guest": guests}))
+                f.write('\n')
+            f.write(json.dumps({"city_id": city_id, "user_id": user_id,
+                                "color": "red"}) + '\n')
+            f.write(json.dumps({"city_id": city_id, "user_id": user_id,
+                                "created_at": "yesterday"}) + '\n')
+            f.write('{"city_id": \n')
+            f.write(json.dumps({"id": 5, "city_id": city_id,
+                                "user_id": user_id, "name": "Den"}) + '\n')
+            f.write(json.dumps({"city_id": city_id,
+                                "user_id": user_id}) + '\n')
+        with patch.object(HBNBCommand, 'import_batch', 1), \
+                patch('console.storage.save') as save, \
+                patch('sys.stdout', new=StringIO()) as f:
+            self.console.onecmd('import Place ' + jsonl_path)
+            output = f.getvalue()
+        self.assertEqual(save.call_count, 1)
+        self.assertIn("** row 3: unknown column color **", output)
+        self.assertIn("** row 4: invalid created_at yesterday **", output)
+        self.assertIn("** row 5: invalid row **", output)
+        self.assertIn("** row 6: invalid id 5 **", output)
+        self.assertIn("** row 7: missing name **", output)
+        self.assertIn("2 rows imported, 5 skipped", output)
+        places = storage.filter(Place, city_id=city_id)
+        self.assertEqual(sorted(p.max_guest for p in places.values()),
+                         [4, 6])
+
+        with patch('sys.stdout', new=StringIO()) as f:
+            self.console.onecmd('import City cities.txt')
+            output = f.getvalue().strip()
+        self.assertEqual(output, "** unsupported file format **")
+        shutil.rmtree(folder)
+
+    def test_export(self):
+        """Test export command to JSON Lines, gzip and CSV"""
+        from models.amenity import Amenity
+        with patch('sys.stdout', new=StringIO()) as f:
+            self.console.onecmd('create Amenity name="Exported"')
+            amenity_id = f.getvalue().strip()
+        folder = tempfile.mkdtemp()
+        count = storage.count(Amenity)
+
+        path = os.path.join(folder, 'amenities.jsonl.gz')
+        with patch('sys.stdout', new=StringIO()) as f:
+            self.console.onecmd('export Amenity ' + path)
+            output = f.getvalue().strip()
+        self.assertEqual(output, "{} rows exported to {}".format(count, path))
+        with gzip.open(path, 'rt') as f:
+            records = [json.loads(line) for line in f]
+        self.assertIn(amenity_id, [r['id'] for r in records])
+        self.assertEqual({r['__class__'] for r in records}, {'Amenity'})
+
+        path = os.path.join(folder, 'recent.out')
+        with patch('sys.stdout', new=StringIO()) as f:
+            self.console.onecmd('export all {} --format csv --since {}'
+                                .format(path, '2999-01-01T00:00:00'))
+            output = f.getvalue().strip()
+        self.assertEqual(output, "0 rows exported to " + path)
+        with open(path, 'r') as f:
+            header = f.readline().strip().split(',')
+        self.assertEqual(header[:4],
+                         ['__class__', 'id', 'created_at', 'updated_at'])
+        self.assertIn('price_by_night', header)
+
+        with patch('sys.stdout', new=StringIO()) as f:
+            self.console.onecmd('export all {} --since yesterday'
+                                .format(path))
+            output = f.getvalue().strip()
+        self.assertEqual(output, "** invalid timestamp: yesterday **")
+
+        path = os.path.join(folder, 'aware.jsonl')
+        with patch('sys.stdout', new=StringIO()) as f:
+            self.console.onecmd('export Amenity {} --since {}'
+                                .format(path, '2000-01-01T00:00:00+02:00'))
+            output = f.getvalue().strip()
+        self.assertEqual(output, "{} rows exported to {}".format(count, path))
+
+        path = os.path.join(folder, 'missing', 'x.jsonl')
+        with patch('sys.stdout', new=StringIO()) as f:
+            self.console.onecmd('export Amenity ' + path)
+            output = f.getvalue().strip()
+        self.assertEqual(output, "** can't write file: {} **".format(path))
+        shutil.rmtree(folder)
+
+    def test_pool_without_database(self):
+        """Test pool command when the storage has no connection pool"""
+        with patch('sys.stdout', new=StringIO()) as f:
+            self.console.onecmd("pool")
+            output = f.getvalue().strip()
+        if hasattr(storage, 'pool_metrics'):
+            self.assertIn("checked_out: ", output)
+        else:
+            self.assertEqual(output, "** storage has no connection pool **")
+
+    def test_cache_without_database(self):
+        """Test cache command when the storage has no object cache"""
+        with patch('sys.stdout', new=StringIO()) as f:
+            self.console.onecmd("cache")
+            output = f.getvalue().strip()
+        if hasattr(storage, 'cache_stats'):
+            self.assertIn("hits: ", output)
+        else:
+            self.assertEqual(output, "** storage has no object cache **")
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,128 @@
+#!/usr/bin/python3
+import asyncio
+import json
+import os
+import threading
+import unittest
+from unittest.mock import patch
+from models.engine.async_storage import AsyncFileStorage
+from models.engine.file_storage import FileStorage
+from models.city import City
+from models.place import Place
+from models.state import State
+
+
+class TestAsyncFileStorage(unittest.TestCase):
+    """Test the AsyncFileStorage class"""
+
+    def setUp(self):
+        """Set up for test"""
+        self.storage = AsyncFileStorage()
+        self.file_path = FileStorage._FileStorage__file_path
+
+    def tearDown(self):
+        """Clean up after tests"""
+        for path in [self.file_path, self.file_path + '.fts']:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def test_round_trip(self):
+        """Test new, save, get, all, count and delete"""
+        async def run():
+            state = State(name='Oregon')
+            self.storage.new(state)
+            await self.storage.save()
+            with open(self.file_path) as f:
+                self.assertIn('State.' + state.id, json.load(f))
+            self.assertIs(await self.storage.get(State, state.id), state)
+            self.assertIn('State.' + state.id, await self.storage.all(State))
+            before = await self.storage.count(State)
+            await self.storage.delete(state)
+            await self.storage.save()
+            self.assertIsNone(await self.storage.get(State, state.id))
+            self.assertEqual(await self.storage.count(State), before - 1)
+        asyncio.run(run())
+
+    def test_operations_in_flight(self):
+        """Test that many concurrent operations complete"""
+        async def run():
+            states = [State(name=str(n)) for n in range(50)]
+            for state in states:
+                self.storage.new(state)
+            await asyncio.gather(self.storage.save(), *[
+                self.storage.get(State, state.id) for state in states])
+            found = await asyncio.gather(*[
+                self.storage.get(State, state.id) for state in states])
+            self.assertEqual(found, states)
+            for state in states:
+                await self.storage.delete(state)
+            await self.storage.save()
+        asyncio.run(run())
+
+    def test_new_applied_off_the_loop(self):
+        """Test that new() is queued and applied in a worker thread"""
+        threads = []
+        new = FileStorage.new
+
+        def record(storage, obj):
+            """Notes the thread adding obj"""
+            threads.append(threading.get_ident())
+            new(storage, obj)
+
+        async def run():
+            state = State(name='Ohio')
+            with patch.object(FileStorage, 'new', record):
+                self.storage.new(state)
+                self.assertEqual(threads, [])
+                self.assertIs(await self.storage.get(State, state.id),
+                              state)
+            self.assertEqual(len(threads), 1)
+            self.assertNotEqual(threads[0], threading.get_ident())
+            await self.storage.delete(state)
+        asyncio.run(run())
+
+    def test_reload_leaves_nothing_dirty(self):
+        """Test that the objects built by reload() are not queued as
+        changed by their attribute writes"""
+        async def run():
+            states = [State(name=str(n)) for n in range(5)]
+            for state in states:
+                self.storage.new(state)
+            await self.storage.save()
+            await self.storage.reload()
+            self.assertGreaterEqual(await self.storage.count(State), 5)
+            self.assertEqual(FileStorage._FileStorage__dirty, set())
+            self.assertEqual(len(self.storage._AsyncFileStorage__pending), 0)
+            for state in states:
+                await self.storage.delete(state)
+            await self.storage.save()
+        with patch('models.storage', self.storage):
+            asyncio.run(run())
+
+    def test_queries(self):
+        """Test iter, records, search and the related() lookups"""
+        async def run():
+            state = State(name='Idaho')
+            city = City(name='Boise', state_id=state.id)
+            place = Place(city_id=city.id, user_id='u', name='Cabin',
+                          description='quiet wooden cabin')
+            for obj in (state, city, place):
+                self.storage.new(obj)
+            await self.storage.save()
+            self.assertEqual(self.storage.related(City, 'state_id',
+                                                  state.id), [city])
+            found = [obj async for obj in self.storage.iter(City,
+                                                            batch_size=1)]
+            self.assertIn(city, found)
+            records = [record async for record in
+                       self.storage.records(State, batch_size=1)]
+            self.assertIn(state.id, [record['id'] for record in records])
+            self.assertEqual(await self.storage.search(Place, 'wooden'),
+                             [place])
+            for obj in (place, city, state):
+                await self.storage.delete(obj)
+        asyncio.run(run())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -101,6 +101,11 @@ class TestDBStorage(unittest.TestCase):
         final_count = len(storage.all(User))
         self.assertEqual(final_count, initial_count)
 
+    def test_count(self):
+        """Test the count method"""
+        self.assertEqual(storage.count(State), len(storage.all(State)))
+        self.assertEqual(storage.count(), len(storage.all()))
+
 
 if __name__ == '__main__':
     unittest.main()
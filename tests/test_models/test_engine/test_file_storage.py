@@ -2,10 +2,21 @@
 
 
 import unittest
-from models.engine.file_storage import FileStorage
+from io import StringIO
+from unittest.mock import patch
+from models.engine.file_storage import FileStorage, _RecordStream, \
+    _RecordTable, _CompactRecord, _ReadWriteLock, _LazyObjects, \
+    _DictRecord, _lock
+from models.engine import binary_format, text_index
 from models.base_model import BaseModel
+from models.state import State
+from models.city import City
+from models.place import Place
+from models.review import Review
 import os
 import json
+import glob
+import threading
 
 
 class TestFileStorage(unittest.TestCase):
@@ -18,8 +29,17 @@ class TestFileStorage(unittest.TestCase):
         self.obj.save()
 
     def tearDown(self) -> None:
-        if os.path.exists(self.file_path):
-            os.remove(self.file_path)
+        FileStorage._FileStorage__journal = False
+        FileStorage._FileStorage__lazy = False
+        FileStorage._FileStorage__compact = False
+        FileStorage._FileStorage__layout = 'json'
+        FileStorage._FileStorage__unloaded = set()
+        FileStorage._FileStorage__text = None
+        for path in [self.file_path, self.file_path + '.log',
+                     self.file_path + '.fts', 'file.bin',
+                     'copy.json'] + glob.glob('file.*.json'):
+            if os.path.exists(path):
+                os.remove(path)
 
     def test_all_returns_all_objects(self):
         """Test that all() returns all objects in storage"""
@@ -89,6 +109,13 @@ class TestFileStorage(unittest.TestCase):
             saved_data = json.load(file)
             self.assertIn(obj.__class__.__name__ + '.' + obj.id, saved_data)
 
+    def test_save_without_changes_writes_nothing(self):
+        """Test that save() leaves the file alone when nothing changed"""
+        self.storage.save()
+        os.remove(self.file_path)
+        self.storage.save()
+        self.assertFalse(os.path.exists(self.file_path))
+
     def test_reload_method(self):
         obj = BaseModel()
         self.storage.new(obj)
@@ -98,6 +125,563 @@ class TestFileStorage(unittest.TestCase):
         self.assertIn(obj.__class__.__name__ + '.' + obj.id,
                       self.storage.all())
 
+    def test_journal_save_appends_records(self):
+        """Test that journal mode appends to the log, not the snapshot"""
+        FileStorage._FileStorage__journal = True
+        snapshot = os.path.getmtime(self.file_path), \
+            os.path.getsize(self.file_path)
+        obj = BaseModel()
+        obj.save()
+        self.storage.delete(obj)
+        self.assertEqual(snapshot, (os.path.getmtime(self.file_path),
+                                    os.path.getsize(self.file_path)))
+        with open(self.file_path + '.log', 'r') as f:
+            records = [json.loads(line) for line in f]
+        key = 'BaseModel.' + obj.id
+        self.assertEqual(records[-2][:2], ['put', key])
+        self.assertEqual(records[-1], ['del', key])
+
+    def test_journal_reload_replays_log(self):
+        """Test that reload applies the log on top of the snapshot"""
+        FileStorage._FileStorage__journal = True
+        obj = BaseModel()
+        obj.save()
+        key = 'BaseModel.' + obj.id
+        del FileStorage._FileStorage__objects[key]
+        self.storage.reload()
+        self.assertIn(key, self.storage.all())
+        self.assertEqual(self.storage.all()[key].id, obj.id)
+
+    def test_journal_torn_tail_ignored(self):
+        """Test that a partially written log record is skipped"""
+        FileStorage._FileStorage__journal = True
+        obj = BaseModel()
+        obj.save()
+        with open(self.file_path + '.log', 'a') as f:
+            f.write('["put","BaseModel.torn",{"id"')
+        self.storage.reload()
+        self.assertIn('BaseModel.' + obj.id, self.storage.all())
+        self.assertNotIn('BaseModel.torn', self.storage.all())
+
+    def test_journal_torn_tail_truncated(self):
+        """Test that saves after a torn log record survive a reload"""
+        FileStorage._FileStorage__journal = True
+        first = BaseModel()
+        first.save()
+        with open(self.file_path + '.log', 'r+') as f:
+            f.truncate(os.path.getsize(self.file_path + '.log') - 5)
+        self.storage.reload()
+        second, third = BaseModel(), BaseModel()
+        second.save()
+        third.save()
+        for key in list(FileStorage._FileStorage__objects):
+            del FileStorage._FileStorage__objects[key]
+        self.storage.reload()
+        self.assertIn('BaseModel.' + second.id, self.storage.all())
+        self.assertIn('BaseModel.' + third.id, self.storage.all())
+
+    def test_compact_folds_log_into_snapshot(self):
+        """Test that compact() rewrites the snapshot and drops the log"""
+        FileStorage._FileStorage__journal = True
+        obj = BaseModel()
+        obj.save()
+        self.storage.compact()
+        self.assertFalse(os.path.exists(self.file_path + '.log'))
+        with open(self.file_path, 'r') as f:
+            self.assertIn('BaseModel.' + obj.id, json.load(f))
+
+    def test_save_serializes_only_dirty_objects(self):
+        """Test that save() reuses cached JSON for unchanged objects"""
+        other = BaseModel()
+        other.save()
+        self.obj.name = "changed"
+        with patch.object(BaseModel, 'to_dict', autospec=True,
+                          side_effect=BaseModel.to_dict) as to_dict:
+            self.storage.save()
+        self.assertEqual([c.args[0] for c in to_dict.call_args_list],
+                         [self.obj])
+
+    def test_attribute_write_is_persisted(self):
+        """Test that a plain attribute write marks the object dirty"""
+        self.storage.save()
+        self.obj.name = "dirty"
+        self.storage.save()
+        with open(self.file_path, 'r') as f:
+            saved = json.load(f)['BaseModel.' + self.obj.id]
+        self.assertEqual(saved['name'], "dirty")
+
+    def test_all_with_subclass_filter(self):
+        """Test that all(cls) only returns objects of cls's bucket"""
+        state = State(name="Oregon")
+        self.storage.new(state)
+        states = self.storage.all(State)
+        self.assertIn('State.' + state.id, states)
+        self.assertNotIn('BaseModel.' + self.obj.id, states)
+        self.assertIn('State.' + state.id, self.storage.all(BaseModel))
+        self.storage.delete(state)
+        self.assertNotIn('State.' + state.id, self.storage.all(State))
+
+    def test_count(self):
+        """Test that count() matches the size of all()"""
+        self.assertEqual(self.storage.count(), len(self.storage.all()))
+        before = self.storage.count(State)
+        state = State(name="Utah")
+        self.storage.new(state)
+        self.assertEqual(self.storage.count(State), before + 1)
+        self.assertEqual(self.storage.count(State),
+                         len(self.storage.all(State)))
+        self.storage.delete(state)
+        self.assertEqual(self.storage.count(State), before)
+
+    def test_related_follows_foreign_key_updates(self):
+        """Test that the reverse index tracks new, update and delete"""
+        first, second = State(name="Ohio"), State(name="Iowa")
+        city = City(name="Columbus", state_id=first.id)
+        self.storage.new(city)
+        self.assertEqual(self.storage.related(City, 'state_id', first.id),
+                         [city])
+        city.state_id = second.id
+        self.assertEqual(self.storage.related(City, 'state_id', first.id),
+                         [])
+        self.assertEqual(self.storage.related(City, 'state_id', second.id),
+                         [city])
+        self.storage.delete(city)
+        self.assertEqual(self.storage.related(City, 'state_id', second.id),
+                         [])
+
+    def test_lazy_reload_builds_on_access(self):
+        """Test that lazy mode only builds objects when accessed"""
+        FileStorage._FileStorage__lazy = True
+        state = State(name="Texas")
+        city = City(name="Austin", state_id=state.id)
+        city.save()
+        key = 'City.' + city.id
+        self.storage.reload()
+        objects = self.storage.all()
+        self.assertIn(key, objects)
+        self.assertNotIsInstance(dict.__getitem__(objects, key), City)
+        self.assertEqual(self.storage.count(City),
+                         len(self.storage.all(City)))
+        built = self.storage.get(City, city.id)
+        self.assertIsInstance(built, City)
+        self.assertEqual(built.name, "Austin")
+        self.assertIs(dict.__getitem__(objects, key), built)
+        self.assertEqual(self.storage.related(City, 'state_id', state.id),
+                         [built])
+
+    def test_lazy_save_keeps_unbuilt_records(self):
+        """Test that saving a lazy store writes records it never built"""
+        FileStorage._FileStorage__lazy = True
+        self.storage.reload()
+        self.storage.save()
+        with open(self.file_path, 'r') as f:
+            saved = json.load(f)
+        self.assertEqual(saved['BaseModel.' + self.obj.id],
+                         self.obj.to_dict())
+
+    def test_record_stream_matches_json_load(self):
+        """Test that the streaming decoder agrees with json.load"""
+        text = json.dumps({'a.1': {'x': '{\\"}', 'n': [1, 2]},
+                           'b.2': {}, 'c.3': {'y': 1.5}}, indent=1)
+        for size in (1, 3, 7, 1 << 16):
+            pairs = list(_RecordStream(StringIO(text), chunk_size=size))
+            self.assertEqual(dict(pairs), json.loads(text))
+        self.assertEqual(list(_RecordStream(StringIO(' {} '))), [])
+
+    def test_record_stream_rejects_truncated_file(self):
+        """Test that a truncated document raises JSONDecodeError"""
+        stream = _RecordStream(StringIO('{"a.1": {"x": 1}, "b.2": {"y"'), 4)
+        with self.assertRaises(json.JSONDecodeError):
+            list(stream)
+        with self.assertRaises(json.JSONDecodeError):
+            list(_RecordStream(StringIO('')))
+
+    def test_sharded_save_rewrites_changed_shards(self):
+        """Test that save() only rewrites the shards of changed classes"""
+        FileStorage._FileStorage__layout = 'sharded'
+        state = State(name="Maine")
+        self.storage.new(state)
+        self.storage.compact()
+        self.assertTrue(os.path.exists('file.State.json'))
+        base_inode = os.stat('file.BaseModel.json').st_ino
+        state_inode = os.stat('file.State.json').st_ino
+        state.name = "Vermont"
+        self.storage.save()
+        self.assertEqual(os.stat('file.BaseModel.json').st_ino, base_inode)
+        self.assertNotEqual(os.stat('file.State.json').st_ino, state_inode)
+        with open('file.State.json', 'r') as f:
+            self.assertEqual(json.load(f)['State.' + state.id]['name'],
+                             "Vermont")
+
+    def test_sharded_reload_loads_needed_classes(self):
+        """Test that a shard is only read when its class is needed"""
+        FileStorage._FileStorage__layout = 'sharded'
+        state = State(name="Idaho")
+        self.storage.new(state)
+        self.storage.compact()
+        self.storage.reload()
+        unloaded = FileStorage._FileStorage__unloaded
+        self.assertIn('State', unloaded)
+        loaded = self.storage.get(State, state.id)
+        self.assertIsNot(loaded, state)
+        self.assertEqual(loaded.name, "Idaho")
+        self.assertNotIn('State', unloaded)
+        self.assertIn('BaseModel', unloaded)
+        self.assertIn('BaseModel.' + self.obj.id, self.storage.all())
+        self.assertEqual(unloaded, set())
+
+    def test_sharded_reload_in_parallel(self):
+        """Test that several shards can be decoded by worker processes"""
+        FileStorage._FileStorage__layout = 'sharded'
+        state = State(name="Kansas")
+        city = City(name="Wichita", state_id=state.id)
+        self.storage.new(state)
+        self.storage.new(city)
+        self.storage.compact()
+        with patch.object(FileStorage, '_FileStorage__workers', 2), \
+                patch.object(FileStorage,
+                             '_FileStorage__parallel_min_bytes', 0):
+            self.storage.reload()
+            self.assertEqual(self.storage.related(City, 'state_id',
+                                                  state.id)[0].name,
+                             "Wichita")
+            self.assertIn('State.' + state.id, self.storage.all())
+
+    def test_binary_reload_decodes_single_record(self):
+        """Test that a lazy binary reload decodes only accessed records"""
+        FileStorage._FileStorage__layout = 'binary'
+        FileStorage._FileStorage__lazy = True
+        state = State(name="Nevada")
+        self.storage.new(state)
+        self.storage.save()
+        self.storage.reload()
+        objects = self.storage.all()
+        raw = dict.__getitem__(objects, 'BaseModel.' + self.obj.id)
+        self.assertNotIsInstance(raw, BaseModel)
+        self.assertEqual(self.storage.get(State, state.id).name, "Nevada")
+        self.assertIs(dict.__getitem__(objects, 'BaseModel.' + self.obj.id),
+                      raw)
+        self.storage.save()
+        self.storage.reload()
+        self.assertEqual(self.storage.get(BaseModel, self.obj.id).id,
+                         self.obj.id)
+
+    def test_binary_reload_unmaps_when_eager(self):
+        """Test that an eager binary reload closes the mapped file"""
+        FileStorage._FileStorage__layout = 'binary'
+        self.storage.new(State(name="Nevada"))
+        self.storage.save()
+        views = []
+        load = binary_format.load
+
+        def record(path):
+            """Notes the mapped file"""
+            view, index = load(path)
+            views.append(view)
+            return view, index
+
+        with patch.object(binary_format, 'load', record):
+            self.storage.reload()
+        self.assertTrue(views[0].closed)
+        self.assertEqual(self.storage.get(BaseModel, self.obj.id).id,
+                         self.obj.id)
+
+    def test_binary_version_mismatch_raises(self):
+        """Test that a snapshot of another marshal version is refused
+        instead of loaded as an empty store"""
+        FileStorage._FileStorage__layout = 'binary'
+        self.storage.new(State(name="Nevada"))
+        self.storage.save()
+        with open('file.bin', 'r+b') as f:
+            f.seek(8)
+            f.write(bytes([binary_format.MARSHAL_VERSION - 1]))
+        with self.assertRaises(RuntimeError):
+            self.storage.reload()
+        with self.assertRaises(RuntimeError):
+            binary_format.to_json('file.bin', 'copy.json')
+
+    def test_binary_format_converts_from_and_to_json(self):
+        """Test that file.json survives a round trip through file.bin"""
+        self.storage.save()
+        binary_format.from_json(self.file_path, 'file.bin')
+        view, index = binary_format.load('file.bin')
+        key = 'BaseModel.' + self.obj.id
+        self.assertEqual(binary_format.decode(view, *index[key]),
+                         self.obj.to_dict())
+        binary_format.to_json('file.bin', 'copy.json')
+        with open(self.file_path) as f, open('copy.json') as copy:
+            self.assertEqual(json.load(copy), json.load(f))
+
+    def test_compact_record_round_trip(self):
+        """Test that a compact record unpacks to the original record"""
+        table = _RecordTable()
+        city = City(name="Reno", state_id=State().id)
+        packed = _CompactRecord(City, table, city.to_dict())
+        self.assertEqual(packed.record, city.to_dict())
+        self.assertIsInstance(packed.values[table.position('created_at')],
+                              int)
+        other = _CompactRecord(City, table, {'__class__': 'City', 'id': '1',
+                                             'created_at': 'not a date',
+                                             'extra': None})
+        self.assertEqual(other.record, {'__class__': 'City', 'id': '1',
+                                        'created_at': 'not a date',
+                                        'extra': None})
+        self.assertEqual(packed.record, city.to_dict())
+
+    def test_compact_lazy_reload(self):
+        """Test that compact lazy records build into equal objects"""
+        FileStorage._FileStorage__lazy = True
+        FileStorage._FileStorage__compact = True
+        state = State(name="Alaska")
+        city = City(name="Juneau", state_id=state.id)
+        city.save()
+        self.storage.reload()
+        raw = dict.__getitem__(self.storage.all(), 'City.' + city.id)
+        self.assertIsInstance(raw, _CompactRecord)
+        self.assertEqual(self.storage.related(City, 'state_id', state.id)[0]
+                         .to_dict(), city.to_dict())
+
+    def test_filter(self):
+        """Test equality, range and in conditions of filter()"""
+        city = City(name="Boise", state_id=State().id)
+        places = [Place(city_id=city.id, user_id="u", name=str(n),
+                        max_guest=n) for n in range(5)]
+        other = Place(city_id=City().id, user_id="u", max_guest=9)
+        for place in places + [other]:
+            self.storage.new(place)
+        found = self.storage.filter(Place, city_id=city.id, max_guest__gte=3)
+        self.assertEqual(sorted(o.max_guest for o in found.values()), [3, 4])
+        found = self.storage.filter(Place, max_guest__lt=1,
+                                    city_id__in=[city.id, other.city_id])
+        self.assertEqual(list(found), ['Place.' + places[0].id])
+        found = self.storage.filter(Place, name__in=["1", "2"])
+        self.assertEqual(len(found), 2)
+        self.assertEqual(self.storage.filter(Place, max_guest__ne=9,
+                                             city_id=other.city_id), {})
+        with self.assertRaises(ValueError):
+            self.storage.filter(Place, max_guest__like=1)
+        with self.assertRaises(ValueError):
+            self.storage.filter(Place, nope=1)
+        for place in places + [other]:
+            self.storage.delete(place)
+
+    def test_filter_with_range_indexes(self):
+        """Test that price/capacity ranges follow new, update, delete"""
+        city_id = City().id
+        places = [Place(city_id=city_id, user_id="u", max_guest=n % 4,
+                        price_by_night=n * 10) for n in range(12)]
+        for place in places:
+            self.storage.new(place)
+
+        def search(**criteria):
+            """Returns the sorted prices of the matching places"""
+            found = self.storage.filter(Place, city_id=city_id, **criteria)
+            return sorted(o.price_by_night for o in found.values())
+
+        self.assertEqual(search(price_by_night__lt=60, max_guest__gte=3),
+                         [30])
+        self.assertEqual(search(price_by_night__gte=70,
+                                price_by_night__lte=90), [70, 80, 90])
+        index = FileStorage._FileStorage__indexes[(Place, 'price_by_night')]
+        self.assertEqual(index.values, sorted(index.values))
+        places[3].price_by_night = 200
+        places[7].max_guest = 0
+        self.storage.delete(places[11])
+        self.assertEqual(search(max_guest__gte=3), [200])
+        self.assertEqual(search(price_by_night__gt=100), [200])
+        self.assertEqual(search(price_by_night__gte=110), [200])
+        for place in places[:11]:
+            self.storage.delete(place)
+        self.assertEqual(search(price_by_night__gte=0), [])
+
+    def test_near_and_within(self):
+        """Test radius and bounding-box search across the antimeridian"""
+        points = [(-17.80, 179.90), (-17.70, -179.95), (-17.80, 178.00),
+                  (-18.60, 179.90)]
+        places = [Place(city_id="c", user_id="u", latitude=lat,
+                        longitude=lon) for lat, lon in points]
+        for place in places:
+            self.storage.new(place)
+
+        found = self.storage.near(-17.80, 179.95, 50)
+        self.assertEqual(found, [places[0], places[1]])
+        places[2].longitude = 179.85
+        found = self.storage.near(-17.80, 179.95, 50)
+        self.assertEqual(found, [places[0], places[2], places[1]])
+        self.assertEqual(self.storage.near(-17.80, 179.95, 100),
+                         [places[0], places[2], places[1], places[3]])
+        box = self.storage.within(-18.00, 179.00, -17.00, 180.00)
+        self.assertEqual(set(box.values()), {places[0], places[2]})
+        self.storage.delete(places[0])
+        self.assertEqual(self.storage.near(-17.80, 179.95, 50),
+                         [places[2], places[1]])
+        for place in places[1:]:
+            self.storage.delete(place)
+
+    def test_search_ranks_and_persists(self):
+        """Test that search ranks matches and reuses the saved index"""
+        loft = Place(city_id="c", user_id="u", name="Zebracove loft",
+                     description="zebracove, zebracove views")
+        flat = Place(city_id="c", user_id="u", description="near zebracove")
+        review = Review(place_id=loft.id, user_id="u",
+                        text="Zebracove was great")
+        for obj in [loft, flat, review]:
+            self.storage.new(obj)
+
+        self.assertEqual(self.storage.search(Place, "ZEBRACOVE"),
+                         [loft, flat])
+        self.assertEqual(self.storage.search(Review, "zebracove"), [review])
+        self.assertEqual(len(self.storage.search(BaseModel, "zebracove")),
+                         3)
+        flat.description = "quiet street"
+        self.assertEqual(self.storage.search(Place, "zebracove"), [loft])
+        self.storage.save()
+        self.assertFalse(os.path.exists(self.file_path + '.fts'))
+        self.storage.compact()
+        self.assertTrue(os.path.exists(self.file_path + '.fts'))
+
+        FileStorage._FileStorage__text = None
+        with patch.object(text_index.TextIndex, 'add') as add:
+            self.assertEqual(self.storage.search(Place, "quiet"), [flat])
+        add.assert_not_called()
+        self.storage.delete(loft)
+        self.assertEqual(self.storage.search(Place, "zebracove"), [])
+        self.storage.delete(flat)
+        self.storage.delete(review)
+
+    def test_iter_pages_in_key_order(self):
+        """Test that iter streams objects in key order from a cursor"""
+        states = [State(name=str(n)) for n in range(5)]
+        for state in states:
+            self.storage.new(state)
+        keys = sorted("State." + state.id for state in states)
+
+        found = ["State." + obj.id
+                 for obj in self.storage.iter(State, batch_size=2)]
+        self.assertEqual(found, sorted(found))
+        self.assertEqual([key for key in found if key in keys], keys)
+        after = ["State." + obj.id for obj in
+                 self.storage.iter(State, batch_size=2, after=keys[1])]
+        self.assertEqual(after, found[found.index(keys[1]) + 1:])
+        every = list(self.storage.iter())
+        self.assertEqual(len(every), self.storage.count())
+        for state in states:
+            self.storage.delete(state)
+
+    def test_bulk_create_indexes_and_saves_once(self):
+        """Test that bulk_create files rows in built indexes, saves once"""
+        city_id = City().id
+        self.storage.filter(Place, price_by_night__gt=0)
+        rows = [{'city_id': city_id, 'user_id': "u", 'name': str(n),
+                 'price_by_night': n} for n in range(20, 0, -1)]
+        with patch.object(FileStorage, 'save') as save:
+            self.assertEqual(self.storage.bulk_create(Place, rows), 20)
+        save.assert_called_once_with()
+
+        found = self.storage.filter(Place, city_id=city_id,
+                                    price_by_night__lte=3)
+        self.assertEqual(sorted(o.price_by_night for o in found.values()),
+                         [1, 2, 3])
+        index = FileStorage._FileStorage__indexes[(Place, 'price_by_night')]
+        self.assertEqual(index.values, sorted(index.values))
+        self.storage.save()
+        with open(self.file_path, 'r') as f:
+            self.assertEqual(sum(1 for v in json.load(f).values()
+                                 if v.get('city_id') == city_id), 20)
+        for obj in list(found.values()):
+            self.storage.delete(obj)
+        self.assertEqual(len(self.storage.filter(Place, city_id=city_id,
+                                                 price_by_night__lte=3)), 0)
+        for obj in self.storage.filter(Place, city_id=city_id).values():
+            self.storage.delete(obj)
+
+    def test_concurrent_readers_and_writer(self):
+        """Test that reader threads run safely beside a writer thread"""
+        errors = []
+        done = threading.Event()
+
+        def read():
+            """Lists, counts and pages the states until the writer ends"""
+            try:
+                while not done.is_set():
+                    self.storage.all(State)
+                    self.storage.count(State)
+                    list(self.storage.iter(State, batch_size=7))
+            except Exception as e:
+                errors.append(e)
+
+        def write():
+            """Creates, updates, saves and deletes states"""
+            try:
+                for n in range(50):
+                    state = State(name=str(n))
+                    self.storage.new(state)
+                    state.name = "renamed"
+                    self.storage.save()
+                    self.storage.delete(state)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                done.set()
+
+        threads = [threading.Thread(target=read) for _ in range(4)]
+        threads.append(threading.Thread(target=write))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_lazy_build_skips_deleted_keys(self):
+        """Test that building the records of a mapping whose keys are
+        deleted meanwhile does not fail"""
+        objs = _LazyObjects()
+
+        class Deleting(_DictRecord):
+            """A record whose build deletes the other record"""
+            __slots__ = ()
+
+            def build(self):
+                """Deletes State.b as a concurrent delete() would"""
+                dict.pop(objs, 'State.b', None)
+                return super().build()
+
+        dict.__setitem__(objs, 'State.a', Deleting(State, {'name': 'a'}))
+        dict.__setitem__(objs, 'State.b', _DictRecord(State, {'name': 'b'}))
+        self.assertEqual([obj.name for obj in objs.values()], ['a'])
+
+    def test_touch_skips_object_deleted_while_waiting(self):
+        """Test that a touch() waiting on the lock while its object is
+        deleted does not put the object back in the indexes"""
+        state = State(name="Kansas")
+        city = City(name="Topeka", state_id=state.id)
+        self.storage.new(state)
+        self.storage.new(city)
+        with _lock.write():
+            writer = threading.Thread(target=setattr,
+                                      args=(city, 'name', 'Wichita'))
+            writer.start()
+            while not _lock.waiting:
+                threading.Event().wait(0.001)
+            self.storage.delete(city)
+        writer.join()
+        self.assertEqual(self.storage.related(City, 'state_id', state.id),
+                         [])
+        self.assertNotIn('City.' + city.id, FileStorage._FileStorage__dirty)
+        self.storage.delete(state)
+
+    def test_read_write_lock_reentry(self):
+        """Test that the writer may re-enter but a reader cannot upgrade"""
+        lock = _ReadWriteLock()
+        with lock.write(), lock.read(), lock.write():
+            self.assertEqual(lock.writer, threading.get_ident())
+        with lock.read(), lock.read():
+            self.assertEqual(lock.readers, 1)
+            with self.assertRaises(RuntimeError):
+                with lock.write():
+                    pass
+        self.assertEqual((lock.readers, lock.writer), (0, None))
+
 
 if __name__ == "__main__":
     unittest.main()
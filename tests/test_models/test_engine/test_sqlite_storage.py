@@ -0,0 +1,423 @@
+#!/usr/bin/python3
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import patch
+from models.engine.db_storage import pool_options
+from models.engine.sqlite_storage import SQLiteStorage
+from models.place import Place
+from models.state import State
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+# Fills the database with 3 states of 2 cities with a place each
+FIXTURE = """
+import json
+from models import storage
+from models.city import City
+from models.place import Place
+from models.state import State
+from models.user import User
+user = User(email="a@b.c", password="pw")
+storage.new(user)
+for n in range(3):
+    state = State(name=str(n))
+    storage.new(state)
+    for m in range(2):
+        city = City(name=str(m), state_id=state.id)
+        storage.new(city)
+        storage.new(Place(city_id=city.id, user_id=user.id, name="p"))
+storage.save()
+storage.close()
+"""
+
+
+class TestSQLiteStorage(unittest.TestCase):
+    """Test the SQLiteStorage class"""
+
+    def setUp(self):
+        """Set up for test"""
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, 'hbnb.db')
+
+    def tearDown(self):
+        """Clean up after tests"""
+        shutil.rmtree(self.folder)
+
+    def run_models(self, script, **env):
+        """Runs FIXTURE then script in a process where the models are
+        mapped for a database engine, so their relationships exist, and
+        returns what script prints as JSON"""
+        env = dict(os.environ, HBNB_TYPE_STORAGE='sqlite',
+                   HBNB_SQLITE_PATH=self.path, **env)
+        env.pop('HBNB_ENV', None)
+        done = subprocess.run([sys.executable, '-c', FIXTURE + script],
+                              cwd=ROOT, env=env, capture_output=True,
+                              text=True)
+        self.assertEqual(done.returncode, 0, done.stderr)
+        return json.loads(done.stdout)
+
+    def test_load_plan_removes_n_plus_one(self):
+        """Test that include loads a relationship path in one query per
+        level instead of one per parent"""
+        counts = self.run_models("""
+counts = []
+for include in (None, ["cities.places"]):
+    with storage.track_queries() as counter:
+        states = storage.all(State, include=include).values()
+        places = [p for s in states for c in s.cities for p in c.places]
+    counts.append([counter.count, len(places)])
+    storage.close()
+print(json.dumps(counts))
+""")
+        self.assertEqual(counts, [[2 + 6, 6], [3, 6]])
+
+    def test_concurrent_all(self):
+        """Test that all() loading tables on worker threads returns the
+        objects the sequential path returns, attached to the session,
+        with collection and many-to-one load plans"""
+        result = self.run_models("""
+sequential = sorted(storage.all())
+storage.close()
+found = {}
+for include in (None, ["places"]):
+    objs = storage.all(include=include)
+    user = objs["User." + user.id]
+    with storage.track_queries() as counter:
+        places = len(user.places)
+    found[str(include)] = [sorted(objs) == sequential, places,
+                           counter.count, storage.get(User, user.id) is user]
+    storage.close()
+objs = storage.all(include=["user", "city.state"])
+places = [o for o in objs.values() if isinstance(o, Place)]
+with storage.track_queries() as counter:
+    states = {p.city.state.name for p in places}
+found["many-to-one"] = [sorted(objs) == sequential, len(states),
+                        counter.count,
+                        all(p.user is objs["User." + user.id]
+                            for p in places)]
+storage.close()
+storage.new(State(name="pending"))
+objs = storage.all()
+found["pending"] = len([o for o in objs.values() if isinstance(o, State)])
+print(json.dumps(found))
+""", HBNB_MYSQL_WORKERS='4', HBNB_MYSQL_CACHE_SIZE='0')
+        self.assertEqual(result, {"None": [True, 6, 1, True],
+                                  "['places']": [True, 6, 0, True],
+                                  "many-to-one": [True, 3, 0, True],
+                                  "pending": 4})
+
+    def test_import_rolls_back_failed_batch(self):
+        """Test that the console import reports a batch the database
+        rejects and keeps the batches stored before it"""
+        path = os.path.join(self.folder, 'users.jsonl')
+        result = self.run_models("""
+import io
+import os
+from contextlib import redirect_stdout
+from console import HBNBCommand
+path = os.environ["IMPORT_PATH"]
+HBNBCommand.import_batch = 2
+rows = [{"email": "b@c.d", "password": "pw"}] * 3 + [
+    {"id": user.id, "email": "dup", "password": "pw"}]
+with open(path, "w") as f:
+    f.write("".join(json.dumps(row) + "\\n" for row in rows))
+out = io.StringIO()
+with redirect_stdout(out):
+    HBNBCommand().onecmd("import User " + path)
+storage.close()
+print(json.dumps([out.getvalue().splitlines(), storage.count(User)]))
+""", IMPORT_PATH=path)
+        self.assertIn("** rows 3-4: batch rolled back (IntegrityError) **",
+                      result[0])
+        self.assertIn("2 rows imported, 2 skipped", result[0][-1])
+        self.assertEqual(result[1], 3)
+
+    def test_round_trip_in_wal_mode(self):
+        """Test that saved objects are read back from a WAL database"""
+        storage = SQLiteStorage(self.path)
+        storage.reload()
+        state = State(name='Utah')
+        storage.new(state)
+        storage.save()
+        storage.close()
+        self.assertEqual(storage.get(State, state.id).name, 'Utah')
+        self.assertEqual(storage.count(State), 1)
+        storage.close()
+        with sqlite3.connect(self.path) as conn:
+            mode = conn.execute('PRAGMA journal_mode').fetchone()[0]
+        self.assertEqual(mode, 'wal')
+
+    def test_batched_commits(self):
+        """Test that only every n-th save() commits"""
+        with patch.dict(os.environ, {'HBNB_SQLITE_COMMIT_EVERY': '2'}):
+            storage = SQLiteStorage(self.path)
+        storage.reload()
+        reader = SQLiteStorage(self.path)
+        reader.reload()
+        states = [State(name='A'), State(name='B'), State(name='C')]
+        storage.new(states[0])
+        storage.save()
+        self.assertEqual(storage.count(State), 1)
+        self.assertEqual(reader.count(State), 0)
+        reader.close()
+        storage.new(states[1])
+        storage.save()
+        self.assertEqual(reader.count(State), 2)
+        reader.close()
+        storage.new(states[2])
+        storage.save()
+        storage.close()
+        self.assertEqual(reader.count(State), 3)
+        reader.close()
+
+    def test_pool_options(self):
+        """Test that the pool arguments follow HBNB_MYSQL_POOL_* and that
+        turning the ping off turns recycling on"""
+        options = pool_options()
+        self.assertEqual((options['pool_pre_ping'], options['pool_recycle'],
+                          options['pool_size'], options['max_overflow'],
+                          options['pool_timeout']), (True, -1, 5, 10, 30))
+        env = {'HBNB_MYSQL_PRE_PING': '0', 'HBNB_MYSQL_POOL_SIZE': '2',
+               'HBNB_MYSQL_MAX_OVERFLOW': '1',
+               'HBNB_MYSQL_POOL_TIMEOUT': '0.5'}
+        with patch.dict(os.environ, env):
+            options = pool_options()
+            self.assertEqual((options['pool_pre_ping'],
+                              options['pool_recycle'], options['pool_size'],
+                              options['max_overflow'],
+                              options['pool_timeout']),
+                             (False, 3600, 2, 1, 0.5))
+            with patch.dict(os.environ, {'HBNB_MYSQL_POOL_RECYCLE': '60'}):
+                self.assertEqual(pool_options()['pool_recycle'], 60)
+            storage = SQLiteStorage(self.path)
+        pool = storage._DBStorage__engine.pool
+        self.assertEqual((pool.size(), pool._max_overflow, pool._timeout,
+                          pool._recycle, pool._pre_ping),
+                         (2, 1, 0.5, 3600, False))
+
+    def test_pool_metrics(self):
+        """Test that pool_metrics() reports the connections in use and
+        the checkouts made"""
+        with patch.dict(os.environ, {'HBNB_MYSQL_POOL_SIZE': '2'}):
+            storage = SQLiteStorage(self.path)
+        storage.reload()
+        storage.count(State)
+        metrics = storage.pool_metrics()
+        self.assertEqual(sorted(metrics), [
+            'checked_in', 'checked_out', 'checkouts', 'checkouts_per_sec',
+            'overflow', 'size', 'wait_avg_ms', 'wait_max_ms'])
+        self.assertEqual((metrics['size'], metrics['checked_out'],
+                          metrics['overflow']), (2, 1, 0))
+        storage.close()
+        metrics = storage.pool_metrics()
+        self.assertEqual(metrics['checked_out'], 0)
+        self.assertGreaterEqual(metrics['checked_in'], 1)
+        self.assertGreaterEqual(metrics['checkouts'], 2)
+        self.assertAlmostEqual(metrics['checkouts_per_sec'],
+                               metrics['checkouts'] / 60)
+        self.assertGreaterEqual(metrics['wait_max_ms'],
+                                metrics['wait_avg_ms'])
+        self.assertGreaterEqual(metrics['wait_avg_ms'], 0)
+
+    def test_bulk_create_and_new_many(self):
+        """Test that bulk_create() inserts chunked rows with their id and
+        timestamps filled in, committing only when asked, and that
+        new_many() adds objects to the session"""
+        storage = SQLiteStorage(self.path)
+        storage.reload()
+        reader = SQLiteStorage(self.path)
+        reader.reload()
+        rows = [{'name': str(n)} for n in range(4)]
+        rows.append({'id': 'fixed', 'name': 'fixed', '__class__': 'State',
+                     'created_at': '2020-01-02T03:04:05.000006'})
+        with storage.track_queries() as counter:
+            self.assertEqual(storage.bulk_create(State, rows, chunk_size=2,
+                                                 save=False), 5)
+        # a SAVEPOINT, one INSERT per chunk of 2 and the RELEASE
+        self.assertEqual(counter.count, 5)
+        self.assertEqual(reader.count(State), 0)
+        reader.close()
+        storage.save()
+        self.assertEqual(reader.count(State), 5)
+        fixed = reader.get(State, 'fixed')
+        self.assertEqual(fixed.created_at,
+                         datetime(2020, 1, 2, 3, 4, 5, 6))
+        self.assertEqual(len({state.id for state in
+                              reader.all(State).values()}), 5)
+        self.assertTrue(all(state.updated_at for state in
+                            reader.all(State).values()))
+        reader.close()
+        self.assertEqual(storage.bulk_create(State, [{'name': 'saved'}]), 1)
+        self.assertEqual(reader.count(State), 6)
+        reader.close()
+        states = [State(name='many'), State(name='more')]
+        storage.new_many(states)
+        storage.save()
+        self.assertEqual(len(reader.filter(State, name__in=['many',
+                                                            'more'])), 2)
+        reader.close()
+        storage.close()
+
+    def test_iter_and_records(self):
+        """Test that iter() and records() stream rows in key order from
+        a key or a timestamp on"""
+        storage = SQLiteStorage(self.path)
+        storage.reload()
+        storage.bulk_create(State, [
+            {'id': name, 'name': name,
+             'updated_at': '2020-01-0{}T00:00:00.000000'.format(day)}
+            for day, name in enumerate('edcba', 1)])
+        self.assertEqual([state.id for state in
+                          storage.iter(State, batch_size=2)],
+                         list('abcde'))
+        self.assertEqual([state.id for state in
+                          storage.iter(State, after='State.b')],
+                         list('cde'))
+        records = list(storage.records(State, batch_size=2,
+                                       since=datetime(2020, 1, 4)))
+        self.assertEqual([record['id'] for record in records], ['a', 'b'])
+        self.assertEqual(records[0]['__class__'], 'State')
+        self.assertEqual(records[0]['updated_at'], '2020-01-05T00:00:00')
+        aware = datetime(2020, 1, 4, tzinfo=timezone.utc)
+        local = aware.astimezone().replace(tzinfo=None)
+        self.assertEqual(
+            [record['id'] for record in storage.records(State,
+                                                        since=aware)],
+            [record['id'] for record in storage.records(State,
+                                                        since=local)])
+        storage.close()
+
+    def test_near_and_search(self):
+        """Test the geographic and full-text queries in SQL"""
+        with patch.dict(os.environ, {'HBNB_SQLITE_FOREIGN_KEYS': '0'}):
+            storage = SQLiteStorage(self.path)
+            storage.reload()
+            places = [
+                Place(city_id='c', user_id='u', name='Pier', latitude=37.8,
+                      longitude=-122.4, description='quiet wooden cabin'),
+                Place(city_id='c', user_id='u', name='Hill', latitude=37.9,
+                      longitude=-122.4, description='wooden deck'),
+                Place(city_id='c', user_id='u', name='Far', latitude=40.0,
+                      longitude=-120.0, description='wooden wooden cabin')]
+            storage.new_many(places)
+            storage.save()
+            storage.close()
+            self.assertEqual([place.name for place in
+                              storage.near(37.8, -122.4, 50)],
+                             ['Pier', 'Hill'])
+            self.assertEqual(len(storage.within(37, -123, 38, -122)), 2)
+            self.assertEqual([place.name for place in
+                              storage.search(Place, 'wooden cabin')],
+                             ['Far', 'Pier', 'Hill'])
+            self.assertEqual(storage.search(Place, 'igloo'), [])
+            storage.close()
+
+    def test_begin_commits_or_rolls_back(self):
+        """Test that begin() commits a block that succeeds and rolls back
+        one that raises"""
+        storage = SQLiteStorage(self.path)
+        storage.reload()
+        kept, dropped = State(name='kept'), State(name='dropped')
+        with storage.begin():
+            storage.new(kept)
+        with self.assertRaises(KeyError):
+            with storage.begin():
+                storage.new(dropped)
+                storage.get(State, dropped.id)
+                raise KeyError('abort')
+        reader = SQLiteStorage(self.path)
+        reader.reload()
+        self.assertIsNotNone(reader.get(State, kept.id))
+        self.assertIsNone(reader.get(State, dropped.id))
+        reader.close()
+
+    def test_sessions_per_thread(self):
+        """Test that threads get sessions of their own and close() only
+        removes the calling thread's"""
+        storage = SQLiteStorage(self.path)
+        storage.reload()
+        registry = storage._DBStorage__session
+        sessions = {}
+        ready, closed, done = (threading.Event() for _ in range(3))
+
+        def worker():
+            """Holds a session while the main thread closes its own"""
+            sessions['before'] = registry()
+            ready.set()
+            closed.wait()
+            sessions['after'] = registry()
+            done.set()
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        ready.wait()
+        mine = registry()
+        self.assertIsNot(mine, sessions['before'])
+        storage.close()
+        closed.set()
+        done.wait()
+        thread.join()
+        self.assertIsNot(registry(), mine)
+        self.assertIs(sessions['after'], sessions['before'])
+        storage.close()
+
+    def test_filter_unknown_attribute(self):
+        """Test that filter() rejects an attribute that is not a column"""
+        storage = SQLiteStorage(self.path)
+        storage.reload()
+        with self.assertRaises(ValueError):
+            storage.filter(State, nope=1)
+        self.assertEqual(storage.filter(State, name='none'), {})
+        storage.close()
+
+    def test_object_cache(self):
+        """Test that get() reads through the cache until a write"""
+        with patch.dict(os.environ, {'HBNB_MYSQL_CACHE_SIZE': '2'}):
+            storage = SQLiteStorage(self.path)
+        cache = storage._DBStorage__cache
+        storage.reload()
+        states = [State(name=str(n)) for n in range(3)]
+        for state in states:
+            storage.new(state)
+        storage.save()
+        storage.close()
+        storage.get(State, states[0].id)
+        storage.close()
+        with storage.track_queries() as counter:
+            self.assertEqual(storage.get(State, states[0].id).name, '0')
+        self.assertEqual(counter.count, 0)
+        obj = storage.get(State, states[0].id)
+        obj.name = 'renamed'
+        storage.save()
+        storage.close()
+        self.assertEqual(storage.get(State, states[0].id).name, 'renamed')
+        storage.get(State, states[1].id)
+        storage.get(State, states[2].id)
+        storage.close()
+        self.assertEqual(cache.stats()['hits'], 2)
+        self.assertEqual(cache.stats()['misses'], 4)
+        self.assertEqual(cache.stats()['evictions'], 1)
+        self.assertNotIn('State.' + states[0].id, cache.entries)
+
+    def test_object_cache_scope(self):
+        """Test that the cache is off by default and shared only by the
+        storages of one database"""
+        self.assertEqual(SQLiteStorage(self.path)._DBStorage__cache.size, 0)
+        other = os.path.join(self.folder, 'other.db')
+        with patch.dict(os.environ, {'HBNB_MYSQL_CACHE_SIZE': '2'}):
+            caches = [SQLiteStorage(path)._DBStorage__cache
+                      for path in (self.path, self.path, other)]
+        self.assertIs(caches[0], caches[1])
+        self.assertIsNot(caches[0], caches[2])
+
+
+if __name__ == '__main__':
+    unittest.main()
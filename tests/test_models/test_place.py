@@ -3,6 +3,7 @@ from models import storage
 from models.city import City
 from models.user import User
 from models.place import Place
+from models.review import Review
 
 
 class TestPlace(unittest.TestCase):
@@ -45,6 +46,20 @@ class TestPlace(unittest.TestCase):
         self.assertEqual(self.place.name, "My Place")
         self.assertEqual(self.place.description, "Nice place")
 
+    def test_place_reviews_relationship(self):
+        """Test the relationships of the place with cities and reviews"""
+        review = Review(text="Great", place_id=self.place.id,
+                        user_id=self.user.id)
+        storage.new(review)
+        storage.save()
+        self.assertIn(self.place, self.city.places)
+        self.assertIn(self.place, self.user.places)
+        self.assertIn(review, self.place.reviews)
+        self.assertIn(review, self.user.reviews)
+        storage.delete(review)
+        storage.save()
+        self.assertNotIn(review, self.place.reviews)
+
 
 if __name__ == '__main__':
     unittest.main()